@@ -1,22 +1,12 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import io
-import numpy as np
 import platform
-import matplotlib.font_manager as fm
 import os
-import time
-from datetime import datetime
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from decimal import Decimal, ROUND_HALF_UP
-import tempfile
-import platform
+import secrets
+from datetime import date, datetime, time as dt_time
 
-import plotly.express as px
-import plotly.graph_objects as go
+from bwt_data_process.metrics import pipeline_run
+from bwt_data_process.startup import preload, setup_chinese_font, timing_report
 
 
 __version__ = '0.2'
@@ -59,35 +49,55 @@ def show_about_page():
     st.write(f"**uname 信息 (platform.uname()):**")
     st.code(str(uname_info), language='text')
 
-
-# 跨平台字体设置函数
-def setup_chinese_font():
-    # 不同平台的常用中文字体
-    if platform.system() == 'Windows':
-        font_list = ['SimHei', 'Microsoft YaHei', 'SimSun']
-    elif platform.system() == 'Darwin':  # macOS
-        font_list = ['PingFang SC', 'Heiti SC', 'STHeiti']
-    else:  # Linux
-        font_list = ['WenQuanYi Micro Hei', 'Noto Sans CJK SC', 'DejaVu Sans']
-    
-    # 获取系统可用字体
-    available_fonts = [f.name for f in fm.fontManager.ttflist]
-    
-    # 查找第一个可用的中文字体
-    for font in font_list:
-        if font in available_fonts:
-            plt.rcParams['font.sans-serif'] = [font, 'DejaVu Sans', 'Arial Unicode MS']
-            plt.rcParams['axes.unicode_minus'] = False
-            return font
-    
-    # 如果没有找到中文字体，使用默认设置
-    plt.rcParams['font.sans-serif'] = ['DejaVu Sans', 'Arial Unicode MS']
-    plt.rcParams['axes.unicode_minus'] = False
-    return 'DejaVu Sans'
-
-# 在模块加载时设置字体
-setup_chinese_font()
-
+    # 启动耗时：各依赖第一次导入（打开用到它的页面时）和字体选择的耗时
+    st.subheader("启动耗时")
+    report = timing_report()
+    if report:
+        st.table([{"项目": name, "耗时 (秒)": f"{seconds:.3f}"} for name, seconds in report])
+        st.caption(f"合计 {sum(seconds for _, seconds in report):.3f} 秒")
+    else:
+        st.write("尚未导入任何页面依赖")
+
+def _megabytes(value):
+    return None if value is None else round(value / 1024 / 1024, 1)
+
+def show_metrics_panel():
+    """性能记录：最近几次处理的各阶段耗时、内存和行数，以及按流程和阶段累计的统计（Prometheus文本格式）"""
+    from bwt_data_process.metrics import RECENT_RUNS, metrics_registry
+
+    with st.expander("性能记录", expanded=True):
+        n = st.number_input("显示最近的运行次数", min_value=1, max_value=RECENT_RUNS, value=10, key="metrics_runs")
+        runs = metrics_registry.recent_runs(n)
+        if not runs:
+            st.write("尚无运行记录（全部命中缓存的页面刷新不记录）")
+        else:
+            st.dataframe([{
+                "开始时间": run['started'],
+                "流程": run['pipeline'],
+                "状态": run['status'],
+                "用时 (秒)": run['seconds'],
+                "内存峰值增长 (MB)": _megabytes(run['rss_growth']),
+                "Python内存峰值 (MB)": _megabytes(run['traced_peak']),
+                "阶段": " / ".join(f"{record['stage']} {record['seconds']:.2f}s"
+                                 for record in run['stages'] if record['depth'] == 0),
+            } for run in runs], hide_index=True, use_container_width=True)
+
+            index = st.selectbox("阶段明细", range(len(runs)), key="metrics_run",
+                                 format_func=lambda i: f"{runs[i]['started']} {runs[i]['pipeline']}")
+            st.dataframe([{
+                "阶段": "　" * record['depth'] + record['stage'],
+                "用时 (秒)": record['seconds'],
+                "行数": record['rows'],
+                "文件数": record['files'],
+                "内存峰值增长 (MB)": _megabytes(record['rss_growth']),
+                "Python内存峰值 (MB)": _megabytes(record['traced_peak']),
+            } for record in runs[index]['stages']], hide_index=True, use_container_width=True)
+            if runs[index]['error']:
+                st.error(runs[index]['error'])
+        st.caption("内存峰值增长为进程常驻内存峰值的增长，之前已达到更高峰值时为0；"
+                   "Python内存峰值需设置环境变量 BWT_TRACE_MEMORY=1 后启动")
+        st.download_button("导出Prometheus指标", metrics_registry.prometheus_text(), file_name="bwt_metrics.prom",
+                           mime="text/plain")
 
 
 # 设置页面配置
@@ -97,255 +107,406 @@ st.set_page_config(
     layout="wide"
 )
 
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+# 各页面用到的较重的依赖，第一次打开页面时才导入，耗时显示在“关于”页面
+PAGE_MODULES = {
+    "M2数据二次处理": ['pandas', 'bwt_data_process.m2'],
+    "纠正预防措施汇总": ['pandas', 'openpyxl', 'bwt_data_process.summary', 'bwt_data_process.jobs'],
+    "产成品数据汇总": ['pandas', 'openpyxl', 'bwt_data_process.summary', 'bwt_data_process.jobs'],
+    "设备日志分析": ['pandas', 'openpyxl', 'pyarrow.dataset', 'plotly.express', 'plotly.graph_objects',
+                 'bwt_data_process.logs', 'bwt_data_process.log_store', 'bwt_data_process.correlation',
+                 'bwt_data_process.fleet', 'bwt_data_process.status_trends', 'bwt_data_process.table_view'],
+    "关于": [],
+}
+
+MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB，M2文件为流式解析，内存占用不随文件大小增长
 def check_file_size(file):
     if file.size > MAX_FILE_SIZE:
-        st.error(f"文件大小超过限制（最大50MB）")
+        st.error(f"文件大小超过限制（最大{MAX_FILE_SIZE // (1024 * 1024)}MB）")
         return False
     return True
 
-def process_m2_data(file_content):
-    """处理M2数据并生成图表"""
-    # 找到Frame (Quantitative)部分
-    # frame_part = file_content.split('Frame (Quantitative)')[1].strip()
-    # 查找包含"Frame"的部分
-    frame_markers = ['Frame (Quantitative)', 'Frame Results']
-    frame_part = None
+# M2图表的分辨率：页面预览和下载
+M2_PREVIEW_DPI = 100
+M2_DOWNLOAD_DPI = 300
 
-    for marker in frame_markers:
-        if marker in file_content:
-            frame_part = file_content.split(marker)[1].strip()
-            break
+def m2_result_cache():
+    """M2分析结果和图表PNG的磁盘缓存（与提取结果缓存分开存放和计算容量）"""
+    from bwt_data_process.cache import DEFAULT_CACHE_DIR, RowCache
 
-    if frame_part is None:
-        raise ValueError("未找到Frame数据部分，请检查文件格式")
+    return RowCache(os.path.join(DEFAULT_CACHE_DIR, 'm2'))
 
-    # 使用pandas读取这部分数据
-    df = pd.read_csv(io.StringIO(frame_part))
-    
-    # 计算比值数据
-    ratio = []
-    for i in range(len(df)):
-        x_val = df.iloc[i, 0]  # Beam Width X
-        y_val = df.iloc[i, 1]  # Beam Width Y
-        if y_val / x_val > 1:
-            ratio.append(x_val / y_val)
+def process_m2_data(uploaded_file):
+    """
+    处理M2数据，分析结果按文件内容哈希缓存，页面重新运行时不再重复解析
+    Returns:
+        tuple: (分析结果, 文件内容哈希)
+    """
+    from bwt_data_process.cache import content_hash
+    from bwt_data_process.m2 import RESULT_VERSION, analyze_m2_stream
+
+    file_hash = content_hash(uploaded_file.getbuffer())
+    cache = m2_result_cache()
+    key = cache.make_key(file_hash, f"result:{RESULT_VERSION}")
+    result = cache.get_many([key]).get(key)
+    if result is None:
+        uploaded_file.seek(0)
+        result = analyze_m2_stream(uploaded_file)
+        cache.put_many([(key, result)])
+    return result, file_hash
+
+def m2_plot_png(result, file_hash, dpi=M2_PREVIEW_DPI, bbox_inches=None):
+    """M2图表的PNG，按文件内容哈希和绘图参数缓存，只在缓存未命中时绘图"""
+    from bwt_data_process.m2 import PLOT_VERSION, render_m2_png
+    from bwt_data_process.startup import chinese_font
+
+    cache = m2_result_cache()
+    params = f"png:{PLOT_VERSION}:{result.criterion:g}:{dpi}:{bbox_inches}:{chinese_font()}"
+    key = cache.make_key(file_hash, params)
+    png = cache.get_many([key]).get(key)
+    if png is None:
+        setup_chinese_font()
+        png = render_m2_png(result, dpi, bbox_inches)
+        cache.put_many([(key, png)])
+    return png
+
+
+def show_m2_metrics(result):
+    """显示M2分析的关键指标"""
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("最小圆度", f"{result.min_roundness:.3f}")
+    col2.metric("焦点处圆度", f"{result.waist_roundness:.3f}")
+    col3.metric("焦点位置 (mm)", f"{result.waist_z:.3f}")
+    col4.metric("束腰 X/Y (μm)", f"{result.waist_width_x:.1f} / {result.waist_width_y:.1f}")
+    if result.is_qualified:
+        st.success(f"所有数据点圆度均不低于{result.criterion:g}，判定合格")
+    else:
+        failed_count = int((~result.passed).sum())
+        st.error(f"{failed_count} 个数据点圆度低于{result.criterion:g}，判定不合格")
+
+def select_worker_count(key):
+    """选择读取数据文件的并行进程数"""
+    from bwt_data_process.parallel import default_workers
+
+    return st.number_input("并行进程数", min_value=1, max_value=max(default_workers(), 1) * 4,
+                           value=default_workers(), step=1, key=key)
+
+def output_download_button(output, file_name, key=None):
+    """提供汇总文件的下载按钮，output为内存缓冲区或磁盘上的文件路径"""
+    mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    if isinstance(output, str):
+        with open(output, 'rb') as f:
+            st.download_button(label="下载汇总文件", data=f, file_name=file_name, mime=mime, key=key)
+    else:
+        st.download_button(label="下载汇总文件", data=output, file_name=file_name, mime=mime, key=key)
+
+def show_row_cache_panel(key):
+    """显示提取结果缓存的使用情况，并提供清空按钮"""
+    from bwt_data_process.cache import RowCache
+
+    with st.expander("缓存信息"):
+        cache = RowCache()
+        info = cache.info()
+        st.write(f"缓存条目: {info['entries']} 个，"
+                 f"占用: {info['bytes'] / 1024 / 1024:.1f} MB / {info['max_bytes'] / 1024 / 1024:.0f} MB")
+        if st.button("清空缓存", key=key):
+            cache.clear()
+            st.success("缓存已清空")
+
+def show_m2_batch():
+    """批量分析多个M2文件并显示汇总表"""
+    from bwt_data_process.m2 import analyze_m2_batch
+
+    uploaded_files = st.file_uploader("选择或拖拽多个CSV文件", type=['csv'], accept_multiple_files=True, key="m2_batch")
+    if not uploaded_files:
+        return
+
+    uploaded_files = [f for f in uploaded_files if check_file_size(f)]
+    file_names = [f.name for f in uploaded_files]
+    if st.session_state.get('m2_batch_files') != file_names:
+        # 上传的文件发生变化后，之前的汇总结果作废
+        st.session_state.m2_batch_summary = None
+        st.session_state.m2_batch_files = file_names
+
+    if st.button("开始批量分析"):
+        with st.spinner(f"正在分析 {len(uploaded_files)} 个文件..."), pipeline_run('m2_batch') as run:
+            sources = [(f.name, f.getvalue()) for f in uploaded_files]
+            st.session_state.m2_batch_summary = analyze_m2_batch(sources)
+            st.session_state.m2_batch_elapsed = run.elapsed
+
+    summary = st.session_state.get('m2_batch_summary')
+    if summary is None:
+        return
+
+    st.subheader("汇总结果")
+    failed = summary['错误信息'] != ''
+    st.info(f"共 {len(summary)} 个文件，合格 {(summary['是否合格'] == '合格').sum()} 个，"
+            f"不合格 {(summary['是否合格'] == '不合格').sum()} 个，出错 {failed.sum()} 个，"
+            f"处理用时: {st.session_state.m2_batch_elapsed:.2f} 秒")
+    st.dataframe(summary, use_container_width=True)
+
+    # 下载汇总表
+    col1, col2 = st.columns(2)
+    col1.download_button(
+        label="下载汇总表(csv)",
+        data=summary.to_csv(index=False).encode('utf-8-sig'),
+        file_name="M2批量分析汇总.csv",
+        mime="text/csv"
+    )
+    xlsx_buffer = io.BytesIO()
+    summary.to_excel(xlsx_buffer, index=False)
+    col2.download_button(
+        label="下载汇总表(xlsx)",
+        data=xlsx_buffer.getvalue(),
+        file_name="M2批量分析汇总.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+    # 只为用户选中的文件绘图
+    files_by_name = {f.name: f for f in uploaded_files}
+    plot_names = st.multiselect("选择要查看图表的文件", summary.loc[~failed, '文件名'].tolist())
+    for name in plot_names:
+        if name not in files_by_name:
+            continue
+        st.markdown(f"**{name}**")
+        result, file_hash = process_m2_data(files_by_name[name])
+        st.image(m2_plot_png(result, file_hash))
+
+# 后台任务的下载文件名
+SUMMARY_OUTPUT_NAMES = {'summary': "纠正预防措施汇总表.xlsx", 'product': "产成品数据汇总表.xlsx"}
+
+# 有任务在运行时，任务列表的刷新间隔（秒）
+JOB_REFRESH_SECONDS = 1
+
+# 保存任务令牌的查询参数名
+JOB_OWNER_PARAM = 'jobs'
+
+def summary_job(templates, output_names, data_files, max_workers, output_paths, use_cache, progress):
+    """
+    在后台线程中运行的汇总（不调用Streamlit），所有模板共用一次读取；返回各模板的结果和缓存命中情况
+    已结束的任务会保留24小时，保存在内存中的结果也写入临时文件，任务结果不占用服务进程的内存
+    """
+    from bwt_data_process.cache import RowCache
+    from bwt_data_process.summary import new_output_path, summarize_templates
+
+    cache = RowCache() if use_cache else None
+    results = summarize_templates(templates, data_files, max_workers, output_paths, cache, progress)
+    outputs = []
+    for name, (output, _) in zip(output_names, results):
+        if not isinstance(output, str):
+            path = new_output_path("summary_")
+            with open(path, 'wb') as f:
+                f.write(output.getbuffer())
+            output = path
+        outputs.append((name, output))
+    return {
+        'outputs': outputs,
+        'count': results[0][1],
+        'cache': None if cache is None else (cache.hits, cache.misses),
+    }
+
+def _file_copy(uploaded_file):
+    """上传文件内容的副本（保留文件名），任务不受页面之后重新运行的影响"""
+    buffer = io.BytesIO(uploaded_file.getvalue())
+    buffer.name = uploaded_file.name
+    return buffer
+
+def job_owner(create=False):
+    """
+    当前用户的任务令牌，保存在页面地址的查询参数中，断线重连或在新标签页打开同一地址后仍能看到自己的任务
+    还没有令牌且create为False时返回None
+    """
+    owner = st.query_params.get(JOB_OWNER_PARAM)
+    if not owner and create:
+        owner = secrets.token_urlsafe(16)
+        st.query_params[JOB_OWNER_PARAM] = owner
+    return owner or None
+
+def submit_summary_job(kind, template_files, data_files, max_workers, stream_output, use_cache):
+    """提交后台汇总任务，kind为'summary'（纠正预防措施）或'product'（产成品），可以同时填写多个模板"""
+    from bwt_data_process.jobs import job_runner
+    from bwt_data_process.summary import new_output_path
+
+    summary_kind = 'capa' if kind == 'summary' else 'product'
+    templates = [(summary_kind, _file_copy(f)) for f in template_files]
+    if len(template_files) == 1:
+        output_names = [SUMMARY_OUTPUT_NAMES[kind]]
+    else:
+        output_names = [f"{os.path.splitext(f.name)[0]}_汇总.xlsx" for f in template_files]
+    output_paths = [new_output_path(f"{summary_kind}_") if stream_output else None for _ in template_files]
+    label = f"{'、'.join(f.name for f in template_files)}，{len(data_files)} 个文件"
+    return job_runner.submit(kind, label, summary_job, templates, output_names, [_file_copy(f) for f in data_files],
+                             max_workers, output_paths, use_cache, owner=job_owner(create=True))
+
+def show_summary_job(job, owner):
+    """显示一个汇总任务的进度或结果（只显示owner自己提交的任务）"""
+    from bwt_data_process.jobs import CANCELLED, DONE, FAILED, QUEUED, job_runner
+
+    with st.container(border=True):
+        st.markdown(f"**{job.label}**　提交于 {datetime.fromtimestamp(job.submitted):%m-%d %H:%M:%S}")
+        if job.status == QUEUED:
+            st.info("正在取消..." if job.cancel_requested else "排队中")
+        elif job.status == DONE:
+            result = job.result
+            st.success(f"成功处理 {result['count']} 个文件，处理用时: {job.elapsed:.2f} 秒")
+            if result['cache'] is not None:
+                st.info(f"缓存命中 {result['cache'][0]} 个文件，重新解析 {result['cache'][1]} 个文件")
+            for index, (name, output) in enumerate(result['outputs']):
+                if len(result['outputs']) > 1:
+                    st.caption(name)
+                output_download_button(output, name, key=f"download_{job.id}_{index}")
+        elif job.status == FAILED:
+            st.error(f"处理文件时出错：{job.error}")
+        elif job.status == CANCELLED:
+            st.warning("已取消")
         else:
-            ratio.append(y_val / x_val)
-    
-    # 创建图形
-    fig, ax1 = plt.subplots(figsize=(10, 6))
-    
-    # 绘制曲线
-    ax1.plot(df.iloc[:, 2], df.iloc[:, 0], 'r-', label='Beam Width X (μm)')
-    ax1.plot(df.iloc[:, 2], df.iloc[:, 1], 'b-', label='Beam Width Y (μm)')
-    
-    # 设置第一个Y轴的标签
-    ax1.set_title('M2 foucs analysis', fontsize=14)
-    ax1.set_xlabel('Z Location (mm)', fontsize=12)
-    ax1.set_ylabel('Beam Width (μm)', fontsize=12)
-    ax1.legend(loc='upper left', fontsize=10)
-    ax1.grid(True)
-    
-    # 创建第二个Y轴用于比值
-    ax2 = ax1.twinx()
-    ax2.plot(df.iloc[:, 2], ratio, 'g--', label='beam roundness')
-    
-    # 添加合格标准线
-    standard_line = ax2.axhline(y=0.9, color='orange', linestyle='-', linewidth=2, alpha=0.7, label='Qualification criteria(0.9)')
-    
-    # 添加合格区域填充
-    x_range = df.iloc[:, 2]
-    ax2.fill_between(x_range, 0.9, 1.0, color='lightgreen', alpha=0.3, label='qualified area')
-    ax2.fill_between(x_range, 0.85, 0.9, color='pink', alpha=0.3, label='unqualified area')
-    
-    ax2.set_ylabel('beam roundness(after focus)', color='g', fontsize=12)
-    ax2.tick_params(axis='y', colors='g')
-    ax2.set_ylim(0.85, 1.0)
-    ax2.legend(loc='upper right', fontsize=10)
-    
-    plt.tight_layout()
-    return fig
-
-def save_fig_to_bytes(fig):
-    """将matplotlib图形保存为字节流"""
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-    buf.seek(0)
-    return buf
-
-def process_summary_data(template_file, data_files):
-    """处理纠正预防措施汇总数据"""
-    try:
-        # 读取模板文件
-        wb = load_workbook(template_file)
-        ws = wb.active
-        
-        # 获取第四行的数据作为映射表
-        first_row_data = {}
-        for col in range(1, ws.max_column + 1):
-            col_letter = get_column_letter(col)
-            cell_value = ws.cell(row=4, column=col).value
-            if cell_value is not None:
-                first_row_data[col_letter] = cell_value
-        
-        # 从第5行开始处理数据文件
-        row = ws.max_row + 1
-        processed_files_count = 0
-        
-        for data_file in data_files:
-            load_wb = load_workbook(data_file, data_only=True)
-            load_sheet = load_wb.active
-            
-            # 写入序号和文件名
-            ws[f'A{row}'] = row-5
-            ws[f'B{row}'] = os.path.basename(data_file.name)
-            
-            # 根据映射表处理数据
-            for target_cell, source_cell in first_row_data.items():
-                if source_cell is not None:
-                    source_value = load_sheet[source_cell].value
-                    if isinstance(source_value, datetime):
-                        source_value = source_value.strftime('%Y/%m/%d')
-                    ws[f'{target_cell}{row}'] = source_value
-            
-            processed_files_count += 1
-            row += 1
-            load_wb.close()
-        
-        # 保存处理后的文件
-        output_buffer = io.BytesIO()
-        wb.save(output_buffer)
-        output_buffer.seek(0)
-        
-        return output_buffer, processed_files_count
-        
-    except Exception as e:
-        st.error(f"处理文件时出错：{str(e)}")
-        return None, 0
+            total = job.total or 0
+            if job.cancel_requested:
+                text = "正在取消..."
+            elif total and job.done >= total:
+                text = "文件已读取完毕，正在写出结果..."
+            else:
+                text = f"已处理 {job.done} / {total} 个文件，已用 {job.elapsed:.0f} 秒"
+                if job.eta is not None:
+                    text += f"，预计剩余 {job.eta:.0f} 秒"
+            st.progress(job.done / total if total else 0.0, text=text)
+
+        if job.active:
+            st.button("取消", key=f"cancel_{job.id}", on_click=job_runner.cancel, args=(job.id, owner),
+                      disabled=job.cancel_requested)
+        else:
+            st.button("移除", key=f"remove_{job.id}", on_click=job_runner.remove, args=(job.id, owner))
 
-def round_to_decimal(value: str, decimal_places: int) -> float:
+def _show_summary_job_list(kind, owner, polling):
+    from bwt_data_process.jobs import job_runner
+
+    jobs = job_runner.jobs(kind, owner)
+    if polling and not any(job.active for job in jobs):
+        # 全部任务已结束，重新运行整个页面以停止定时刷新
+        st.rerun()
+    for job in jobs:
+        show_summary_job(job, owner)
+
+def show_summary_jobs(kind):
     """
-    将字符串数值四舍五入到指定小数位数
-    Args:
-        value (str): 需要四舍五入的字符串数值
-        decimal_places (int): 四舍五入后保留的小数位数
-    Returns:
-        float: 四舍五入后的浮点数
+    显示当前用户提交的该类汇总后台任务（按页面地址中的任务令牌区分），有任务在运行时定时刷新进度
+    页面断开重连后仍可在这里取回已完成的结果
     """
-    format_str = '0.' + '0' * decimal_places
-    return float(Decimal(value).quantize(Decimal(format_str), rounding=ROUND_HALF_UP))
+    from bwt_data_process.jobs import job_runner
 
-def process_product_data(template_file, data_files):
-    """处理产成品数据汇总"""
-    try:
-        # 读取模板文件
-        wb = load_workbook(template_file)
-        ws = wb.active
-        
-        # 获取第一行的数据作为映射表
-        first_row_data = {}
-        for col in range(1, ws.max_column + 1):
-            col_letter = get_column_letter(col)
-            cell_value = ws.cell(row=1, column=col).value
-            if cell_value is not None:
-                first_row_data[col_letter] = cell_value
-        
-        # 从最后一行开始处理数据文件
-        row = ws.max_row + 1
-        processed_files_count = 0
-        
-        for data_file in data_files:
-            load_wb = load_workbook(data_file, data_only=True)
-            load_sheet = load_wb.active
-            
-            # 写入序号和文件名
-            ws[f'A{row}'] = row-1
-            ws[f'B{row}'] = os.path.basename(data_file.name)
-            
-            # 根据映射表处理数据
-            for target_cell, source_cell in first_row_data.items():
-                if source_cell is not None:
-                    source_value = load_sheet[source_cell].value
-                    cell = ws[f'{target_cell}{row}']
-                    cell.value = source_value
-                    
-                    # 如果是日期类型，设置日期格式
-                    if isinstance(source_value, datetime):
-                        cell.number_format = 'yyyy/mm/dd'
-                    
-                    # 特殊处理AR列（功率范围）
-                    if target_cell == 'AR':
-                        var1, var2 = source_value.split('-')
-                        var1 = int(var1[:-3])
-                        var2 = int(var2[:-5])
-                        ws[f'AR{row}'] = var1
-                        ws[f'AS{row}'] = var2
-                    
-                    # 特殊处理AT列（功率计算）
-                    elif target_cell == 'AT':
-                        power = ws[f'AT{row}'].value
-                        ws[f'AU{row}'] = round_to_decimal(power / var1 * 1000, 0)
-            
-            processed_files_count += 1
-            row += 1
-            load_wb.close()
-        
-        # 添加边框
-        thin_border = Border(
-            left=Side(style='thin', color='000000'),
-            right=Side(style='thin', color='000000'),
-            top=Side(style='thin', color='000000'),
-            bottom=Side(style='thin', color='000000')
-        )
-        
-        # 只为新添加的行添加边框
-        for row in range(ws.max_row - processed_files_count + 1, ws.max_row + 1):
-            for col in range(1, ws.max_column + 1):
-                ws.cell(row=row, column=col).border = thin_border
-        
-        # 保存处理后的文件
-        output_buffer = io.BytesIO()
-        wb.save(output_buffer)
-        output_buffer.seek(0)
-        
-        return output_buffer, processed_files_count
-        
-    except Exception as e:
-        st.error(f"处理文件时出错：{str(e)}")
-        return None, 0
+    owner = job_owner()
+    if owner is None:
+        return
+    jobs = job_runner.jobs(kind, owner)
+    if not jobs:
+        return
+    st.subheader("3. 处理任务")
+    polling = any(job.active for job in jobs)
+    st.fragment(_show_summary_job_list, run_every=JOB_REFRESH_SECONDS if polling else None)(kind, owner, polling)
 
 
 
 ###### 日志相关处理函数 #################
+def show_paginated_table(df, key, columns=None):
+    """
+    分页显示日志表格：列选择、搜索和排序在服务器上完成，只把当前页发送到浏览器
+    Args:
+        df (pd.DataFrame): 日志（可以是按时间范围过滤后的切片）
+        key (str): 控件键的前缀
+        columns (list): 默认显示的列，默认为全部列
+    """
+    from bwt_data_process.table_view import DEFAULT_PAGE_SIZE, PAGE_SIZES, table_page
+
+    # 保留原始列名用于取列（load_log读取的日志列名可能不是字符串），只在显示时转为文本
+    all_columns = list(df.columns)
+    shown_columns = st.multiselect("显示的列", all_columns, default=columns or all_columns, format_func=str,
+                                   key=f"{key}_table_columns")
+    if not shown_columns:
+        return
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    search = col1.text_input("搜索（文本列包含该内容，或数值列等于该数）", key=f"{key}_table_search")
+    sort_by = col2.selectbox("排序列", [None] + shown_columns, format_func=lambda col: "不排序" if col is None else str(col),
+                             key=f"{key}_table_sort")
+    descending = col3.checkbox("降序", key=f"{key}_table_descending")
+    page_size = col4.selectbox("每页行数", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                               key=f"{key}_table_page_size")
+    page = st.number_input("页码", min_value=1, value=1, step=1, key=f"{key}_table_page")
+
+    rows, total = table_page(df, shown_columns, search.strip() or None, sort_by, not descending, page - 1, page_size)
+    pages = max(1, -(-total // page_size))
+    st.dataframe(rows.rename(columns=str), hide_index=True, use_container_width=True)
+    st.caption(f"第 {min(page, pages)} / {pages} 页，共 {total} 行")
+
+def end_of_minute(end_date, end_clock):
+    """
+    结束时刻只精确到分钟：返回所选这一分钟的排他上界（下一分钟）之前的最后一纳秒，
+    作为包含端点的结束时间使用时，该分钟内（含亚秒部分）的记录都不会被漏掉；
+    结束时刻为默认的23:59:59时即为当天结束
+    """
+    import pandas as pd
+
+    minute = datetime.combine(end_date, end_clock.replace(second=0, microsecond=0))
+    return pd.Timestamp(minute) + pd.Timedelta(minutes=1) - pd.Timedelta(1, 'ns')
+
+def select_time_range(df, prefix):
+    """选择日期和时刻，返回 (开始时间, 结束时间)，结束时间包含所选的整分钟；df已按时间排序"""
+    min_time = df['time'].iloc[0]
+    max_time = df['time'].iloc[-1]
+    col1, col2 = st.columns(2)
+    start_date = col1.date_input("开始时间", min_time, key=f"{prefix}_start_time")
+    start_clock = col2.time_input("开始时刻", dt_time(0, 0), step=60, key=f"{prefix}_start_clock")
+    end_date = col1.date_input("结束时间", max_time, key=f"{prefix}_end_time")
+    end_clock = col2.time_input("结束时刻", dt_time(23, 59, 59), step=60, key=f"{prefix}_end_clock")
+    return datetime.combine(start_date, start_clock), end_of_minute(end_date, end_clock)
+
+
 ### 报警日志 ####
+def show_alarm_trends(df, alarm_column, start_time, end_time):
+    """显示报警频率、重复间隔（类似MTBF）和次数最多的报警的变化趋势"""
+    import plotly.express as px
+    from bwt_data_process.alarm_stats import FREQUENCIES as ALARM_FREQUENCIES
+    from bwt_data_process.alarm_stats import alarm_intervals, alarm_rates, buckets_for_log, select_buckets, top_alarms
+
+    st.subheader("报警频率与间隔")
+    buckets = select_buckets(buckets_for_log(df), alarm_column, start_time, end_time)
+    if buckets.empty:
+        st.info("该列取值过多或所选范围内没有报警，无法统计报警频率")
+        return
+
+    col1, col2 = st.columns(2)
+    freq = col1.selectbox("统计周期", list(ALARM_FREQUENCIES), format_func=ALARM_FREQUENCIES.get, key="alarm_freq")
+    top_n = col2.number_input("显示前N种报警", min_value=1, max_value=100, value=10, key="alarm_top_n")
+
+    top = top_alarms(buckets, top_n)
+    rates = alarm_rates(buckets[buckets['value'].isin(top.index)], freq)
+    fig = px.bar(rates, title=f"每{ALARM_FREQUENCIES[freq]}报警次数", labels={'value': '次数', 'period': '时间'})
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("**报警次数排名与趋势（后半段相对前半段）**")
+    st.dataframe(top, use_container_width=True)
+    st.markdown("**重复间隔**")
+    st.dataframe(alarm_intervals(buckets), use_container_width=True)
+
 def process_alarm_log(df):
     """处理报警日志数据"""
+    import plotly.express as px
+    from bwt_data_process.logs import count_values, filter_time_range
+
     try:
-        # 确保时间列是datetime类型
-        df['time'] = pd.to_datetime(df['time'], errors='coerce', format='mixed')
-        df = df.dropna(subset=['time'])
-        
         # 让用户选择报警类型列
         alarm_column = st.selectbox("选择报警类型列", df.columns)
         
-        # 时间范围选择
-        min_time = df['time'].min()
-        max_time = df['time'].max()
-       
-        start_time = st.date_input("开始时间", min_time, key="alarm_start_time")
-        end_time = st.date_input("结束时间", max_time, key="alarm_end_time")
+        # 时间范围选择（可精确到秒）
+        start_time, end_time = select_time_range(df, "alarm")
 
         # 过滤数据
-        mask = (df['time'].dt.date >= start_time) & (df['time'].dt.date <= end_time)
-        filtered_df = df[mask]
+        filtered_df = filter_time_range(df, start_time, end_time)
         
-        # 显示数据
-        st.dataframe(filtered_df)
+        # 显示数据（分页）
+        show_paginated_table(filtered_df, "alarm")
         
         # 报警统计
         st.subheader("报警统计")
-        alarm_counts = filtered_df[alarm_column].value_counts()
+        alarm_counts = count_values(filtered_df, alarm_column)
         fig = px.bar(alarm_counts, title="报警类型分布")
         fig.update_layout(
             xaxis=dict(
@@ -357,6 +518,9 @@ def process_alarm_log(df):
         )
         st.plotly_chart(fig)
 
+        # 报警频率、重复间隔和趋势（基于预聚合的小时桶）
+        show_alarm_trends(df, alarm_column, start_time, end_time)
+
     except Exception as e:
         st.error(f"处理报警日志时出错：{str(e)}")
         st.write("请检查文件格式是否正确")
@@ -364,31 +528,25 @@ def process_alarm_log(df):
 
 def process_operate_log(df):
     """处理操作日志数据"""
+    import plotly.express as px
+    from bwt_data_process.logs import count_values, filter_time_range
+
     try:
-        # 确保时间列是datetime类型
-        df['time'] = pd.to_datetime(df['time'], errors='coerce', format='mixed')
-        df = df.dropna(subset=['time'])
-        
         # 让用户选择操作类型列
         operate_column = st.selectbox("选择操作类型列", df.columns)
         
-        # 时间范围选择
-        min_time = df['time'].min()
-        max_time = df['time'].max()
-
-        start_time = st.date_input("开始时间", min_time, key="operate_start_time")
-        end_time = st.date_input("结束时间", max_time, key="operate_end_time")
+        # 时间范围选择（可精确到秒）
+        start_time, end_time = select_time_range(df, "operate")
 
         # 过滤数据
-        mask = (df['time'].dt.date >= start_time) & (df['time'].dt.date <= end_time)
-        filtered_df = df[mask]
+        filtered_df = filter_time_range(df, start_time, end_time)
         
-        # 显示数据
-        st.dataframe(filtered_df)
+        # 显示数据（分页）
+        show_paginated_table(filtered_df, "operate")
         
         # 操作类型统计
         st.subheader("操作类型统计")
-        operate_counts = filtered_df[operate_column].value_counts()
+        operate_counts = count_values(filtered_df, operate_column)
         fig = px.bar(operate_counts, title="操作类型分布")
         fig.update_layout(
             xaxis=dict(
@@ -406,22 +564,69 @@ def process_operate_log(df):
 
 
 
+DOWNSAMPLE_METHOD_NAMES = {'minmax': "区间最小/最大值", 'lttb': "LTTB"}
+
+TREND_WINDOWS = ['1min', '5min', '10min', '30min', '1h', '6h', '1D']
+
+def show_status_trends(df, parameters, start_time, end_time, fig, scatter, n_points, method):
+    """
+    在趋势图上叠加滚动均值、EWMA和异常区间
+    滚动统计对整份日志计算一次后缓存，调整时间范围时只做切片。
+    Returns:
+        tuple: (每个参数的异常统计, 异常区间表)，未启用时返回None
+    """
+    import pandas as pd
+    from bwt_data_process.downsample import downsample
+    from bwt_data_process.status_trends import DEFAULT_HALFLIFE, DEFAULT_WINDOW, DEFAULT_Z, analyze_trend
+
+    if not st.checkbox("滚动统计与异常检测", key="status_trends"):
+        return None
+    col1, col2, col3 = st.columns(3)
+    window = col1.selectbox("滚动窗口", TREND_WINDOWS, index=TREND_WINDOWS.index(DEFAULT_WINDOW),
+                            key="status_trend_window")
+    halflife = col2.selectbox("EWMA半衰期", TREND_WINDOWS, index=TREND_WINDOWS.index(DEFAULT_HALFLIFE),
+                              key="status_trend_halflife")
+    z_threshold = col3.number_input("z-score阈值", min_value=0.5, max_value=20.0, value=DEFAULT_Z, step=0.5,
+                                    key="status_trend_z")
+    col1, col2 = st.columns(2)
+    lower = col1.number_input("下限（可选）", value=None, key="status_trend_lower")
+    upper = col2.number_input("上限（可选）", value=None, key="status_trend_upper")
+
+    summary = {}
+    span_frames = []
+    for col in parameters:
+        with pipeline_run('status_trend'):
+            trend, spans = analyze_trend(df, col, start_time, end_time, window, halflife, z_threshold, lower,
+                                         upper)
+        times = trend['time'].to_numpy()
+        for name, column in [("滚动均值", 'mean'), ("EWMA", 'ewma')]:
+            x_values, y_values = downsample(times, trend[column].to_numpy(), n_points, method)
+            fig.add_trace(scatter(x=x_values, y=y_values, name=f"{col} {name}", mode='lines'))
+        for span in spans.itertuples(index=False):
+            fig.add_vrect(x0=span[0], x1=span[1], fillcolor='red', opacity=0.15, line_width=0)
+        summary[col] = {
+            '异常点数': int(trend['flag'].sum()),
+            '最大|z|': float(trend['z'].abs().max()),
+            'EWMA漂移': float(trend['drift'].iloc[-1]) if len(trend) else float('nan'),
+        }
+        spans.insert(0, '参数', col)
+        span_frames.append(spans)
+    spans = pd.concat(span_frames, ignore_index=True) if span_frames else pd.DataFrame()
+    return pd.DataFrame.from_dict(summary, orient='index'), spans
+
 def process_status_log(df):
     """处理状态日志数据"""
+    import pandas as pd
+    import plotly.graph_objects as go
+    from bwt_data_process.downsample import DEFAULT_POINTS, WEBGL_THRESHOLD, downsample
+    from bwt_data_process.logs import filter_time_range
+
     try:
-        # 确保时间列是datetime类型
-        df['time'] = pd.to_datetime(df['time'], errors='coerce', format='mixed')
-        df = df.dropna(subset=['time'])
-        
-        # 时间范围选择
-        min_time = df['time'].min()
-        max_time = df['time'].max()
-        start_time = st.date_input("开始时间", min_time, key="status_start_time")
-        end_time = st.date_input("结束时间", max_time, key="status_end_time")
+        # 时间范围选择（可精确到秒）
+        start_time, end_time = select_time_range(df, "status")
         
         # 过滤数据
-        mask = (df['time'].dt.date >= start_time) & (df['time'].dt.date <= end_time)
-        filtered_df = df[mask]
+        filtered_df = filter_time_range(df, start_time, end_time)
         
         # 参数选择
         st.subheader("选择要显示的参数")
@@ -430,36 +635,53 @@ def process_status_log(df):
         
         if selected_columns:
             # 显示数据
-            st.dataframe(filtered_df[['time'] + selected_columns])
+            show_paginated_table(filtered_df, "status", ['time'] + selected_columns)
             
             # 绘制选中的参数趋势图
             st.subheader("参数趋势图")
+            col1, col2, col3 = st.columns(3)
+            method = col1.selectbox("降采样方法", list(DOWNSAMPLE_METHOD_NAMES), format_func=DOWNSAMPLE_METHOD_NAMES.get,
+                                    key="status_downsample_method")
+            n_points = col2.number_input("每条曲线最多显示点数", min_value=100, max_value=200000,
+                                         value=DEFAULT_POINTS, step=500, key="status_downsample_points")
+            use_webgl = col3.checkbox("使用WebGL渲染", value=len(filtered_df) > WEBGL_THRESHOLD, key="status_webgl")
+
+            # 缩放：在所选时间范围内重新降采样，而不是放大已降采样的数据
+            view_df = filtered_df
+            view_start, view_end = start_time, end_time
+            if len(filtered_df) > 1:
+                first_time = filtered_df['time'].iloc[0].to_pydatetime()
+                last_time = filtered_df['time'].iloc[-1].to_pydatetime()
+                if first_time < last_time:
+                    view_start, view_end = st.slider("显示时间范围", min_value=first_time, max_value=last_time,
+                                                     value=(first_time, last_time), format="YYYY-MM-DD HH:mm:ss",
+                                                     key="status_view_range")
+                    view_df = filter_time_range(filtered_df, view_start, view_end)
+
+            scatter = go.Scattergl if use_webgl else go.Scatter
             fig = go.Figure()
             for col in selected_columns:
-                # 将NaN值替换为0
-                y_values = filtered_df[col].fillna(0)
-                fig.add_trace(go.Scatter(
-                    x=filtered_df['time'], 
+                # 无效值（NaN）不绘制，而不是当作0
+                y_values = pd.to_numeric(view_df[col], errors='coerce')
+                x_values, y_values = downsample(view_df['time'].to_numpy(), y_values.to_numpy(), n_points, method)
+                fig.add_trace(scatter(
+                    x=x_values, 
                     y=y_values, 
                     name=col,
                     mode='markers',  # 只显示数据点
                     marker=dict(size=6)  # 设置数据点大小
                 ))
-            fig.update_layout(
-                title="参数趋势图",
-                xaxis_title="时间",
-                yaxis_title="数值",
-                hovermode="x unified",
-                height=800,  # 增加图表高度
-                margin=dict(l=50, r=50, t=50, b=50),  # 调整边距
-                xaxis=dict(
-                    tickmode='auto',  # 自动设置刻度
-                    nticks=20,  # 增加刻度数量
-                    tickangle=45,  # 倾斜角度
-                    tickformat='%Y-%m-%d %H:%M:%S'  # 时间格式
-                )
-            )
+            trends = show_status_trends(df, selected_columns, view_start, view_end, fig, scatter, n_points, method)
+            if len(view_df) > n_points:
+                st.caption(f"当前范围共 {len(view_df)} 行，每条曲线降采样至约 {n_points} 个点")
             st.plotly_chart(fig, use_container_width=True)  # 使用容器宽度
+            if trends is not None:
+                summary, spans = trends
+                st.markdown("**异常统计**")
+                st.dataframe(summary, use_container_width=True)
+                if not spans.empty:
+                    st.markdown("**异常区间**")
+                    st.dataframe(spans, use_container_width=True, hide_index=True)
     except Exception as e:
         st.error(f"处理状态日志时出错：{str(e)}")
         st.write("请检查文件格式是否正确")
@@ -467,34 +689,255 @@ def process_status_log(df):
 
 
 
+def process_alarm_correlation(df_alarm, df_status):
+    """每次报警取状态日志前后N秒的窗口，按报警类型汇总各参数的统计值"""
+    import pandas as pd
+    import plotly.express as px
+    from bwt_data_process.correlation import correlate_alarms, superposed_profile
+    from bwt_data_process.logs import count_values
+
+    try:
+        col1, col2, col3 = st.columns(3)
+        alarm_columns = [col for col in df_alarm.columns if col != 'time']
+        alarm_column = col1.selectbox("报警类型列", alarm_columns, key="corr_alarm_column")
+        before = col2.number_input("报警前（秒）", min_value=1, max_value=86400, value=60, key="corr_before")
+        after = col3.number_input("报警后（秒）", min_value=1, max_value=86400, value=60, key="corr_after")
+
+        alarm_counts = count_values(df_alarm, alarm_column)
+        alarm_values = st.multiselect("报警类型", alarm_counts.index.tolist(),
+                                      default=alarm_counts.index[:5].tolist(), key="corr_alarm_values")
+        status_columns = [col for col in df_status.columns
+                          if col != 'time' and pd.api.types.is_numeric_dtype(df_status[col])]
+        parameters = st.multiselect("状态参数", status_columns, default=status_columns[:5], key="corr_parameters")
+        if not alarm_values or not parameters:
+            return
+
+        stats = correlate_alarms(df_alarm, df_status, alarm_column, parameters, before, after, alarm_values)
+        st.dataframe(stats, use_container_width=True)
+
+        # 叠加平均曲线：所有报警对齐到报警时刻
+        st.markdown("**报警前后参数平均变化曲线**")
+        col1, col2 = st.columns(2)
+        profile_alarm = col1.selectbox("报警类型", alarm_values, key="corr_profile_alarm")
+        profile_parameter = col2.selectbox("参数", parameters, key="corr_profile_parameter")
+        alarm_times = df_alarm.loc[df_alarm[alarm_column] == profile_alarm, 'time']
+        profile = superposed_profile(alarm_times, df_status, profile_parameter, before, after)
+        fig = px.line(profile, x='相对时间(秒)', y='均值', title=f"{profile_alarm} 前后 {profile_parameter} 平均值")
+        fig.add_vline(x=0, line_dash='dash', line_color='red')
+        st.plotly_chart(fig, use_container_width=True)
+    except Exception as e:
+        st.error(f"关联分析时出错：{str(e)}")
+
+LOG_KIND_NAMES = {'alarm': "报警日志", 'operate': "操作日志", 'status': "状态日志"}
+
+def select_fleet_sources(kind):
+    """选择参与对比的设备，返回 (设备列表, 开始时间, 结束时间)"""
+    from bwt_data_process.fleet import file_source, store_source
+    from bwt_data_process.log_store import list_dates, list_devices
+
+    source = st.radio("数据来源", ["本地日志库", "上传文件"], horizontal=True, key="fleet_source")
+    if source == "上传文件":
+        fleet_files = st.file_uploader(f"上传多台设备的{LOG_KIND_NAMES[kind]}（文件名作为设备名称）", type=['xlsx'],
+                                       accept_multiple_files=True, key=f"fleet_{kind}_files")
+        fleet_files = [f for f in fleet_files or [] if check_file_size(f)]
+        return [file_source(f) for f in fleet_files], None, None
+
+    devices = list_devices(kind)
+    if not devices:
+        st.info("本地日志库中没有该类日志，请先导入")
+        return [], None, None
+    selected = st.multiselect("设备", devices, default=devices, key=f"fleet_{kind}_devices")
+    dates = sorted(day for device in selected for day in list_dates(kind, device))
+    if not dates:
+        return [], None, None
+    col1, col2 = st.columns(2)
+    start_date = col1.date_input("开始日期", date.fromisoformat(dates[0]), key="fleet_start")
+    end_date = col2.date_input("结束日期", date.fromisoformat(dates[-1]), key="fleet_end")
+    start_time = datetime.combine(start_date, dt_time(0, 0))
+    end_time = end_of_minute(end_date, dt_time(23, 59))
+    return [store_source(device) for device in selected], start_time, end_time
+
+def process_fleet():
+    """多台设备的报警次数和状态参数对比（各设备在工作进程中汇总，不合并完整日志）"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from bwt_data_process.fleet import fleet_alarm_counts, fleet_status, source_columns
+
+    try:
+        kind = st.radio("日志类型", ['alarm', 'status'], format_func=LOG_KIND_NAMES.get, horizontal=True,
+                        key="fleet_kind")
+        sources, start_time, end_time = select_fleet_sources(kind)
+        if not sources:
+            return
+
+        columns = source_columns(sources[0], kind)
+        col1, col2 = st.columns(2)
+        max_workers = select_worker_count("fleet_workers")
+        if kind == 'alarm':
+            alarm_column = col1.selectbox("报警类型列", columns, key="fleet_alarm_column")
+            if st.button("开始对比", key="fleet_alarm_run"):
+                with st.spinner(f"正在统计 {len(sources)} 台设备..."), pipeline_run('fleet_alarm'):
+                    st.session_state.fleet_alarm = fleet_alarm_counts(sources, alarm_column, start_time, end_time,
+                                                                      max_workers)
+            counts = st.session_state.get('fleet_alarm')
+            if counts is None:
+                return
+            if counts.empty:
+                st.info("所选设备在该范围内没有报警")
+                return
+            st.caption("日志库中的设备按导入时预聚合的小时桶统计，时间范围按小时对齐")
+            top_n = col2.number_input("显示前N种报警", min_value=1, max_value=100, value=10, key="fleet_top_n")
+            top = counts.head(top_n)
+            fig = px.bar(top, barmode='group', title="各设备报警次数",
+                         labels={'index': '报警类型', 'value': '次数', 'variable': '设备'})
+            st.plotly_chart(fig, use_container_width=True)
+            st.dataframe(counts, use_container_width=True)
+            return
+
+        parameters = col1.multiselect("状态参数", columns, default=columns[:3], key="fleet_parameters")
+        n_points = col2.number_input("每台设备每条曲线最多显示点数", min_value=100, max_value=20000, value=1000,
+                                     step=100, key="fleet_points")
+        if parameters and st.button("开始对比", key="fleet_status_run"):
+            with st.spinner(f"正在汇总 {len(sources)} 台设备..."), pipeline_run('fleet_status'):
+                st.session_state.fleet_status = fleet_status(sources, parameters, start_time, end_time, n_points,
+                                                             max_workers)
+        result = st.session_state.get('fleet_status')
+        if result is None:
+            return
+        stats, series = result
+        if stats.empty:
+            st.info("所选设备在该范围内没有数据")
+            return
+        st.dataframe(stats, use_container_width=True)
+        for parameter in stats.index.get_level_values('参数').unique():
+            fig = go.Figure()
+            for device, device_series in series.items():
+                if parameter in device_series:
+                    x_values, y_values = device_series[parameter]
+                    fig.add_trace(go.Scattergl(x=x_values, y=y_values, name=device, mode='markers',
+                                               marker=dict(size=4)))
+            fig.update_layout(title=f"{parameter} 各设备趋势")
+            st.plotly_chart(fig, use_container_width=True)
+    except Exception as e:
+        st.error(f"多设备对比时出错：{str(e)}")
+
+def show_log_import():
+    """将日志导入本地日志库（按设备、按天分区的Parquet文件）"""
+    from bwt_data_process.log_store import import_log
+
+    with st.expander("导入日志到本地日志库"):
+        kind = st.selectbox("日志类型", list(LOG_KIND_NAMES), format_func=LOG_KIND_NAMES.get, key="import_kind")
+        device = st.text_input("设备名称", key="import_device")
+        import_files = st.file_uploader("上传日志文件", type=['xlsx'], accept_multiple_files=True, key="import_files")
+        if import_files and device and st.button("导入"):
+            with st.spinner("正在导入..."):
+                try:
+                    total_rows = added_rows = 0
+                    with pipeline_run('import_logs'):
+                        for import_file in import_files:
+                            result = import_log(import_file, kind, device)
+                            total_rows += result['rows']
+                            added_rows += result['added']
+                    st.success(f"已导入 {len(import_files)} 个文件，共 {total_rows} 行，"
+                               f"新增 {added_rows} 行（日志库中已有的记录不重复保存）")
+                except Exception as e:
+                    st.error(f"导入日志时出错：{str(e)}")
+
+def show_time_parse_stats(df):
+    """显示时间列的解析情况"""
+    stats = df.attrs.get('time_parse')
+    if not stats:
+        return
+    message = f"时间格式: {stats['format']}，共 {stats['rows']} 行"
+    if stats['fallback']:
+        message += f"，{stats['fallback']} 行按混合格式解析"
+    if stats['dropped']:
+        message += f"，{stats['dropped']} 行时间无效已丢弃"
+    st.caption(message)
+
+def show_frame_memory(df):
+    """显示已加载日志的行列数和实际占用的内存"""
+    from bwt_data_process.logs import frame_memory
+
+    st.caption(f"已加载 {len(df)} 行 × {len(df.columns)} 列，占用内存 {frame_memory(df) / 1024 / 1024:.1f} MB")
+
+def load_log_from_source(kind):
+    """选择日志来源（上传文件或本地日志库），返回时间列已规范的日志"""
+    from bwt_data_process.log_store import list_dates, list_devices, query_logs_cached
+    from bwt_data_process.logs import load_log_cached
+
+    source = st.radio("数据来源", ["上传文件", "本地日志库"], horizontal=True, key=f"{kind}_source")
+    if source == "上传文件":
+        log_file = st.file_uploader(f"上传{LOG_KIND_NAMES[kind]}文件", type=['xlsx'], key=f"{kind}_log")
+        if log_file:
+            with pipeline_run(f'{kind}_log'):
+                df = load_log_cached(log_file, kind)
+            show_time_parse_stats(df)
+            show_frame_memory(df)
+            return df
+        return None
+
+    devices = list_devices(kind)
+    if not devices:
+        st.info("本地日志库中没有该类日志，请先导入")
+        return None
+    device = st.selectbox("设备", devices, key=f"{kind}_store_device")
+    dates = list_dates(kind, device)
+    start_date = st.date_input("加载开始日期", date.fromisoformat(dates[0]), key=f"{kind}_store_start")
+    end_date = st.date_input("加载结束日期", date.fromisoformat(dates[-1]), key=f"{kind}_store_end")
+    with pipeline_run(f'{kind}_log'):
+        df = query_logs_cached(kind, [device], start_date, end_date)
+    if df.empty:
+        st.info("所选日期范围内没有数据")
+        return None
+    show_frame_memory(df)
+    return df
+
 def show_log_analysis():
     """显示日志分析页面"""
+    from bwt_data_process.logs import log_cache
+
     st.title("设备日志分析")
+    show_log_import()
     
     # 创建标签页
-    tab1, tab2, tab3 = st.tabs(["报警日志", "操作日志", "状态日志"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["报警日志", "操作日志", "状态日志", "报警关联分析", "多设备对比"])
     
     with tab1:
         st.subheader("报警日志分析")
-        alarm_file = st.file_uploader("上传报警日志文件", type=['xlsx'], key="alarm_log")
-        if alarm_file:
-            df_alarm = pd.read_excel(alarm_file)
+        df_alarm = load_log_from_source('alarm')
+        if df_alarm is not None:
             process_alarm_log(df_alarm)
     
     with tab2:
         st.subheader("操作日志分析")
-        operate_file = st.file_uploader("上传操作日志文件", type=['xlsx'], key="operate_log")
-        if operate_file:
-            df_operate = pd.read_excel(operate_file)
+        df_operate = load_log_from_source('operate')
+        if df_operate is not None:
             process_operate_log(df_operate)
     
     with tab3:
         st.subheader("状态日志分析")
-        status_file = st.file_uploader("上传状态日志文件", type=['xlsx'], key="status_log")
-        if status_file:
-            df_status = pd.read_excel(status_file)
+        df_status = load_log_from_source('status')
+        if df_status is not None:
             process_status_log(df_status)
 
+    with tab4:
+        st.subheader("报警与状态参数关联分析")
+        if df_alarm is None or df_status is None:
+            st.info("请先在报警日志和状态日志标签页中加载数据")
+        else:
+            process_alarm_correlation(df_alarm, df_status)
+
+    with tab5:
+        st.subheader("多设备对比")
+        process_fleet()
+
+    # 日志缓存使用情况
+    info = log_cache.info()
+    st.caption(f"日志缓存: {info['entries']} 个文件，"
+               f"{info['bytes'] / 1024 / 1024:.1f} MB / {info['max_bytes'] / 1024 / 1024:.0f} MB，"
+               f"命中 {info['hits']} 次，未命中 {info['misses']} 次")
+
 
 
 
@@ -598,6 +1041,7 @@ def main():
             st.session_state.selected_function = "设备日志分析"
         if st.button("关于", use_container_width=True):
             st.session_state.selected_function = "关于"
+        st.checkbox("性能记录", key="show_metrics", help="在页面底部显示最近几次处理的各阶段耗时和内存")
 
         # 初始化选择的功能
         if 'selected_function' not in st.session_state:
@@ -615,8 +1059,13 @@ def main():
         """, unsafe_allow_html=True)
     
     # 主页面
+    preload(PAGE_MODULES[st.session_state.selected_function])
     if st.session_state.selected_function == "M2数据二次处理":
         st.title("M2数据二次处理")
+        mode = st.radio("处理模式", ["单文件", "批量"], horizontal=True, key="m2_mode")
+        if mode == "批量":
+            show_m2_batch()
+            return
         st.write("请上传CSV文件进行处理")
         
         # 文件上传
@@ -628,21 +1077,28 @@ def main():
                 if not check_file_size(uploaded_file):
                     return
                 
-                # 读取文件内容
-                file_content = uploaded_file.getvalue().decode('utf-8')
-                
-                # 处理数据并显示图表
-                fig = process_m2_data(file_content)
-                st.pyplot(fig)
+                # 流式读取并处理数据，显示图表
+                with pipeline_run('m2'):
+                    result, file_hash = process_m2_data(uploaded_file)
+                    png = m2_plot_png(result, file_hash)
+                show_m2_metrics(result)
+                st.image(png)
+
+                if result.metadata:
+                    with st.expander("文件表头信息"):
+                        st.json(result.metadata)
                 
-                # 添加下载按钮
-                img_bytes = save_fig_to_bytes(fig)
-                st.download_button(
-                    label="下载图表",
-                    data=img_bytes,
-                    file_name="beam_analysis.png",
-                    mime="image/png"
-                )
+                # 高清图片只在用户需要下载时生成（之后从缓存读取）
+                if st.session_state.get('m2_png_hash') == file_hash or st.button("生成高清图表"):
+                    st.session_state.m2_png_hash = file_hash
+                    with pipeline_run('m2'):
+                        png = m2_plot_png(result, file_hash, M2_DOWNLOAD_DPI, 'tight')
+                    st.download_button(
+                        label="下载图表",
+                        data=png,
+                        file_name="beam_analysis.png",
+                        mime="image/png"
+                    )
                 
             except Exception as e:
                 st.error(f"处理文件时出错：{str(e)}")
@@ -653,40 +1109,22 @@ def main():
         
         # 模板文件上传
         st.subheader("1. 上传模板文件")
-        template_file = st.file_uploader("请上传模板文件（Excel格式）", type=['xlsx'], key="template")
+        template_files = st.file_uploader("请上传模板文件（Excel格式，可以上传多个，数据文件只读取一次）", type=['xlsx'],
+                                          accept_multiple_files=True, key="template")
         
         # 数据文件上传
         st.subheader("2. 上传需要汇总的文件")
         data_files = st.file_uploader("请上传需要汇总的文件（Excel格式）", type=['xlsx'], accept_multiple_files=True, key="data")
+        max_workers = select_worker_count(key="data_workers")
+        stream_output = st.checkbox("大批量模式：结果直接写入临时文件", key="data_stream")
+        use_cache = st.checkbox("使用缓存（只解析新增或修改过的文件）", value=True, key="data_cache")
+        show_row_cache_panel(key="data_clear_cache")
         
-        if template_file and data_files:
+        if template_files and data_files:
             if st.button("开始处理"):
-                with st.spinner("正在处理文件..."):
-                    start_time = time.time()
-
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        # 处理文件
-                        # 临时目录会在with块结束时自动删除
-                        output_buffer, processed_count = process_summary_data(template_file, data_files)
-                        
-                        if output_buffer:
-                            # 显示处理结果
-                            st.subheader("3. 处理结果")
-                            st.success(f"成功处理 {processed_count} 个文件")
-                            
-                            # 显示处理时间
-                            elapsed_time = time.time() - start_time
-                            st.info(f"处理用时: {elapsed_time:.2f} 秒")
-                            
-                            # 提供下载按钮
-                            st.download_button(
-                                label="下载汇总文件",
-                                data=output_buffer,
-                                file_name="纠正预防措施汇总表.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                        else:
-                            st.error("处理失败，请检查文件格式是否正确")                
+                # 在后台运行，处理期间可以离开本页面，之后回来取回结果
+                submit_summary_job('summary', template_files, data_files, max_workers, stream_output, use_cache)
+        show_summary_jobs('summary')
 
     
     elif st.session_state.selected_function == "产成品数据汇总":
@@ -694,40 +1132,22 @@ def main():
         
         # 模板文件上传
         st.subheader("1. 上传模板文件")
-        template_file = st.file_uploader("请上传模板文件（Excel格式）", type=['xlsx'], key="product_template")
+        template_files = st.file_uploader("请上传模板文件（Excel格式，可以上传多个，数据文件只读取一次）", type=['xlsx'],
+                                          accept_multiple_files=True, key="product_template")
         
         # 数据文件上传
         st.subheader("2. 上传需要汇总的文件")
         data_files = st.file_uploader("请上传需要汇总的文件（Excel格式）", type=['xlsx'], accept_multiple_files=True, key="product_data")
+        max_workers = select_worker_count(key="product_data_workers")
+        stream_output = st.checkbox("大批量模式：结果直接写入临时文件", key="product_data_stream")
+        use_cache = st.checkbox("使用缓存（只解析新增或修改过的文件）", value=True, key="product_data_cache")
+        show_row_cache_panel(key="product_data_clear_cache")
         
-        if template_file and data_files:
+        if template_files and data_files:
             if st.button("开始处理"):
-                with st.spinner("正在处理文件..."):
-                    start_time = time.time()
-                    
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        # 处理文件
-                        # 临时目录会在with块结束时自动删除
-                        output_buffer, processed_count = process_product_data(template_file, data_files)
-                        
-                        if output_buffer:
-                            # 显示处理结果
-                            st.subheader("3. 处理结果")
-                            st.success(f"成功处理 {processed_count} 个文件")
-                            
-                            # 显示处理时间
-                            elapsed_time = time.time() - start_time
-                            st.info(f"处理用时: {elapsed_time:.2f} 秒")
-                            
-                            # 提供下载按钮
-                            st.download_button(
-                                label="下载汇总文件",
-                                data=output_buffer,
-                                file_name="产成品数据汇总表.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                        else:
-                            st.error("处理失败，请检查文件格式是否正确")
+                # 在后台运行，处理期间可以离开本页面，之后回来取回结果
+                submit_summary_job('product', template_files, data_files, max_workers, stream_output, use_cache)
+        show_summary_jobs('product')
 
     # 日志分析页面
     elif st.session_state.selected_function == "设备日志分析":
@@ -748,4 +1168,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    # 放在页面最后，包含本次页面运行中的处理
+    if st.session_state.get('show_metrics'):
+        show_metrics_panel()
\ No newline at end of file
@@ -0,0 +1 @@
+"""bwt_data_process 数据处理核心（与Streamlit界面无关的部分）"""
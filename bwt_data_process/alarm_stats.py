@@ -0,0 +1,188 @@
+"""
+报警统计的预聚合层
+
+按小时、报警类型汇总报警次数以及首次/末次出现时间和小时内的最小间隔。
+导入日志库时计算一次并保存，查询任意时间范围时只需合并这些小时桶，
+不必重新扫描原始报警记录。
+"""
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .logs import TIME_COLUMN, log_cache
+
+
+# 只对取值个数不超过该值的列做预聚合（报警类型、报警代码等）
+MAX_CATEGORIES = 2000
+
+# 日志库中预聚合结果的类型目录名
+STATS_KIND = 'alarm_stats'
+
+# 统计周期
+FREQUENCIES = {'h': "小时", 'D': "天", 'W': "周"}
+
+BUCKET_COLUMNS = ['hour', 'column', 'value', 'count', 'first', 'last', 'min_gap']
+
+
+def category_columns(df):
+    """适合做报警类型统计的列：文本或整数列，且取值个数不多"""
+    columns = []
+    for col in df.columns:
+        if col == TIME_COLUMN:
+            continue
+        dtype = df[col].dtype
+        if not (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+                or isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_integer_dtype(dtype)):
+            continue
+        if df[col].nunique() <= MAX_CATEGORIES:
+            columns.append(str(col))
+    return columns
+
+
+def alarm_buckets(df, columns=None):
+    """
+    计算小时桶
+    Args:
+        df (pd.DataFrame): 已按时间排序的报警日志
+        columns (list): 需要统计的列，默认为category_columns(df)
+    Returns:
+        pd.DataFrame: 每个（小时, 列, 取值）一行：
+            count 次数，first/last 首次/末次出现时间，min_gap 同一小时内相邻两次的最小间隔
+    """
+    if columns is None:
+        columns = category_columns(df)
+    times = df[TIME_COLUMN].reset_index(drop=True)
+    hours = times.dt.floor('h')
+    frames = []
+    for col in columns:
+        events = pd.DataFrame({
+            'hour': hours,
+            'value': df[col].astype('string').reset_index(drop=True),
+            'time': times,
+        }).dropna(subset=['value'])
+        # 时间已排序，按取值稳定排序后同一取值内仍按时间排列
+        events = events.sort_values('value', kind='stable')
+        same_group = (events['value'] == events['value'].shift()) & (events['hour'] == events['hour'].shift())
+        events['gap'] = events['time'].diff().where(same_group)
+        grouped = events.groupby(['hour', 'value'], sort=True).agg(
+            count=('time', 'size'), first=('time', 'min'), last=('time', 'max'), min_gap=('gap', 'min'))
+        grouped = grouped.reset_index()
+        grouped.insert(1, 'column', col)
+        frames.append(grouped)
+
+    if not frames:
+        return empty_buckets()
+    buckets = pd.concat(frames, ignore_index=True)
+    buckets['value'] = buckets['value'].astype(str)
+    return buckets[BUCKET_COLUMNS]
+
+
+def empty_buckets():
+    return pd.DataFrame({
+        'hour': pd.Series(dtype='datetime64[ns]'), 'column': pd.Series(dtype=str),
+        'value': pd.Series(dtype=str), 'count': pd.Series(dtype='int64'),
+        'first': pd.Series(dtype='datetime64[ns]'), 'last': pd.Series(dtype='datetime64[ns]'),
+        'min_gap': pd.Series(dtype='timedelta64[ns]'),
+    })
+
+
+def read_buckets(paths):
+    """读取日志库中的小时桶文件"""
+    if not paths:
+        return empty_buckets()
+    frames = [pq.read_table(path, partitioning=None).to_pandas() for path in paths]
+    return pd.concat(frames, ignore_index=True)
+
+
+def buckets_for_log(df):
+    """
+    获取日志对应的小时桶，结果在日志缓存中复用
+    从日志库加载的日志直接读取导入时保存的小时桶；上传的文件在第一次使用时计算。
+    """
+    source_key = df.attrs.get('source_key')
+    key = ('alarm_buckets', source_key)
+    if source_key is not None:
+        buckets = log_cache.get(key)
+        if buckets is not None:
+            return buckets
+
+    stats_paths = df.attrs.get('alarm_stats_paths')
+    if stats_paths is not None:
+        buckets = read_buckets(stats_paths)
+    else:
+        buckets = alarm_buckets(df)
+
+    if source_key is not None:
+        log_cache.put(key, buckets)
+    return buckets
+
+
+def select_buckets(buckets, column, start=None, end=None):
+    """取出某一列在时间范围内的小时桶（按小时对齐）"""
+    selected = buckets[buckets['column'] == str(column)]
+    if start is not None:
+        selected = selected[selected['hour'] >= pd.Timestamp(start).floor('h')]
+    if end is not None:
+        selected = selected[selected['hour'] <= pd.Timestamp(end)]
+    return selected
+
+
+def alarm_rates(buckets, freq='h'):
+    """
+    按统计周期合并小时桶，得到每种报警在每个周期内的次数
+    Returns:
+        pd.DataFrame: 行为周期起点，列为报警类型
+    """
+    if buckets.empty:
+        return pd.DataFrame()
+    if freq == 'W':
+        period = buckets['hour'].dt.to_period('W').dt.start_time
+    else:
+        period = buckets['hour'].dt.floor(freq)
+    return (buckets.groupby([period.rename('period'), 'value'])['count'].sum()
+            .unstack(fill_value=0).sort_index())
+
+
+def alarm_intervals(buckets):
+    """
+    每种报警的重复间隔统计（类似MTBF）
+    平均间隔 = (末次 - 首次) / (次数 - 1)，只需要各桶的次数和首末时间即可合并；
+    最小间隔取各桶内部最小间隔与相邻两个桶之间间隔中的最小值。
+    """
+    if buckets.empty:
+        return pd.DataFrame(columns=['次数', '首次出现', '末次出现', '平均间隔(小时)', '最小间隔(分钟)'])
+    ordered = buckets.sort_values(['value', 'hour'])
+    previous_last = ordered.groupby('value')['last'].shift()
+    boundary_gap = ordered['first'] - previous_last
+    ordered = ordered.assign(gap=pd.concat([ordered['min_gap'], boundary_gap], axis=1).min(axis=1))
+    grouped = ordered.groupby('value').agg(
+        count=('count', 'sum'), first=('first', 'min'), last=('last', 'max'), min_gap=('gap', 'min'))
+    repeats = (grouped['count'] - 1).where(grouped['count'] > 1)
+    mean_interval = (grouped['last'] - grouped['first']) / repeats
+    result = pd.DataFrame({
+        '次数': grouped['count'],
+        '首次出现': grouped['first'],
+        '末次出现': grouped['last'],
+        '平均间隔(小时)': (mean_interval.dt.total_seconds() / 3600).round(3),
+        '最小间隔(分钟)': (grouped['min_gap'].dt.total_seconds() / 60).round(2),
+    })
+    return result.sort_values('次数', ascending=False)
+
+
+def top_alarms(buckets, n=10):
+    """
+    次数最多的n种报警，以及后半段相对前半段的变化趋势
+    Returns:
+        pd.DataFrame: 次数、前半段次数、后半段次数、变化率
+    """
+    if buckets.empty:
+        return pd.DataFrame(columns=['次数', '前半段', '后半段', '变化率'])
+    middle = buckets['hour'].min() + (buckets['hour'].max() - buckets['hour'].min()) / 2
+    second_half = buckets['hour'] > middle
+    counts = pd.DataFrame({
+        '前半段': buckets[~second_half].groupby('value')['count'].sum(),
+        '后半段': buckets[second_half].groupby('value')['count'].sum(),
+    }).fillna(0).astype('int64')
+    counts.insert(0, '次数', counts['前半段'] + counts['后半段'])
+    counts['变化率'] = ((counts['后半段'] - counts['前半段']) / counts['前半段'].where(counts['前半段'] > 0)).round(3)
+    return counts.sort_values('次数', ascending=False).head(n)
@@ -0,0 +1,228 @@
+"""
+性能基准：用确定性的合成数据测量各处理流程在不同规模下的耗时和内存，结果保存为JSON
+
+每个用例在单独的子进程中运行，峰值内存互不影响：
+    seconds          每次运行的耗时（秒），共repeat次
+    rss_bytes        运行期间进程常驻内存峰值相对运行前的增量
+    traced_bytes     另做一次运行，用tracemalloc统计Python和numpy分配的内存峰值
+    stages           该次运行中各阶段的耗时（见metrics）
+
+不同版本的结果用compare_results比较，比值大于1表示变慢或内存变多。
+"""
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .metrics import MetricsRegistry, peak_rss_bytes, pipeline_run
+
+
+# 结果文件格式变化时修改该版本号
+RESULT_VERSION = 1
+
+# 各规模的数据量
+SIZES = {
+    'small': {'m2_files': 5, 'm2_frames': 1000, 'reports': 20, 'log_rows': 10000, 'log_columns': 10},
+    'medium': {'m2_files': 20, 'm2_frames': 20000, 'reports': 200, 'log_rows': 100000, 'log_columns': 20},
+    'large': {'m2_files': 50, 'm2_frames': 200000, 'reports': 1000, 'log_rows': 300000, 'log_columns': 50},
+}
+
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'bwt_data_process_bench')
+
+
+def bench_m2(size, data_dir, workers):
+    """单文件M2分析和预览图（与页面上process_m2_data加预览相同），以及批量汇总"""
+    from . import synthetic
+    from .m2 import analyze_m2_batch, analyze_m2_stream, render_m2_png
+
+    paths = synthetic.ensure_ophir_files(data_dir, size['m2_files'], size['m2_frames'])
+
+    def run():
+        with open(paths[0], 'rb') as f:
+            render_m2_png(analyze_m2_stream(f))
+        analyze_m2_batch([(os.path.basename(path), path) for path in paths], workers)
+    return run
+
+
+def _bench_summary(size, data_dir, workers, product):
+    from . import synthetic
+    from .summary import summarize_capa_data, summarize_product_data
+
+    capa_template, product_template, reports = synthetic.ensure_reports(data_dir, size['reports'])
+    template = product_template if product else capa_template
+    summarize = summarize_product_data if product else summarize_capa_data
+
+    def run():
+        output, count = summarize(template, reports, workers)
+        assert count == len(reports)
+    return run
+
+
+def bench_summary(size, data_dir, workers):
+    """纠正预防措施汇总（不使用提取结果缓存）"""
+    return _bench_summary(size, data_dir, workers, product=False)
+
+
+def bench_product(size, data_dir, workers):
+    """产成品数据汇总（不使用提取结果缓存）"""
+    return _bench_summary(size, data_dir, workers, product=True)
+
+
+def bench_logs(size, data_dir, workers):
+    """三类日志的读取和各标签页的主要计算：类型统计、小时桶、滚动统计、降采样"""
+    from . import synthetic
+    from .alarm_stats import alarm_buckets
+    from .downsample import downsample
+    from .logs import count_values, describe_status, load_log, read_log_chunked
+    from .status_trends import parameter_trend
+
+    paths = {kind: synthetic.ensure_log(data_dir, kind, size['log_rows'], size['log_columns'])
+             for kind in ('alarm', 'operate', 'status')}
+
+    def run():
+        alarm = load_log(paths['alarm'])
+        count_values(alarm, '报警类型')
+        alarm_buckets(alarm, ['报警类型'])
+        count_values(load_log(paths['operate']), '操作类型')
+        status = read_log_chunked(paths['status'])
+        describe_status(status)
+        for parameter in ['P0', 'P1']:
+            trend = parameter_trend(status, parameter)
+            downsample(trend['time'].to_numpy(), trend['value'].to_numpy())
+    return run
+
+
+PIPELINES = {
+    'm2': bench_m2,
+    'summary': bench_summary,
+    'product': bench_product,
+    'logs': bench_logs,
+}
+
+
+def run_case(task):
+    """
+    在子进程中运行一个用例（准备数据不计入耗时）
+    Args:
+        task (tuple): (流程名, 规模名, 数据目录, 重复次数, 工作进程数)
+    Returns:
+        dict: 用例结果
+    """
+    pipeline, size_name, data_dir, repeat, workers = task
+    size = SIZES[size_name]
+    run = PIPELINES[pipeline](size, data_dir, workers)
+
+    rss_before = peak_rss_bytes()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(round(time.perf_counter() - start, 4))
+    rss_after = peak_rss_bytes()
+    rss_bytes = None if rss_before is None or rss_after is None else rss_after - rss_before
+
+    tracemalloc.start()
+    try:
+        # 各阶段开始时会重置tracemalloc的峰值，整次运行的峰值由运行记录合并得到
+        with pipeline_run(pipeline, MetricsRegistry()) as traced_run:
+            run()
+        traced_bytes = traced_run.traced_peak
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'pipeline': pipeline,
+        'size': size_name,
+        'params': size,
+        'workers': workers,
+        'seconds': seconds,
+        'best': min(seconds),
+        'median': round(statistics.median(seconds), 4),
+        'rss_bytes': rss_bytes,
+        'traced_bytes': traced_bytes,
+        'stages': traced_run.stage_seconds(),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(pipelines=None, sizes=None, data_dir=DEFAULT_DATA_DIR, repeat=3, workers=1, progress=None):
+    """
+    运行基准测试
+    Args:
+        pipelines (list): 流程名，默认为全部（见PIPELINES）
+        sizes (list): 规模名，默认为['small']（见SIZES）
+        data_dir (str): 合成数据目录，已生成的数据会复用
+        repeat (int): 每个用例的计时次数
+        workers (int): 汇总和批量分析的工作进程数，默认1以便结果稳定
+        progress: 每个用例结束后调用 progress(用例结果)
+    Returns:
+        dict: 环境信息和各用例结果
+    """
+    pipelines = pipelines or list(PIPELINES)
+    sizes = sizes or ['small']
+    cases = []
+    context = multiprocessing.get_context('spawn')
+    for size_name in sizes:
+        for pipeline in pipelines:
+            # 每个用例使用新的进程，峰值内存不受之前用例的影响
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case = executor.submit(run_case, (pipeline, size_name, data_dir, repeat, workers)).result()
+            cases.append(case)
+            if progress is not None:
+                progress(case)
+    return {
+        'version': RESULT_VERSION,
+        'revision': _git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'cases': cases,
+    }
+
+
+def save_results(results, path):
+    with io.open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path):
+    with io.open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current):
+    """
+    按（流程, 规模）比较两次基准结果
+    Returns:
+        list: 每个共同用例一项：耗时（best）和内存（traced_bytes）的比值，current / baseline
+    """
+    base_cases = {(case['pipeline'], case['size']): case for case in baseline['cases']}
+    rows = []
+    for case in current['cases']:
+        base = base_cases.get((case['pipeline'], case['size']))
+        if base is None:
+            continue
+        rows.append({
+            'pipeline': case['pipeline'],
+            'size': case['size'],
+            'time_ratio': round(case['best'] / base['best'], 3) if base['best'] else None,
+            'memory_ratio': round(case['traced_bytes'] / base['traced_bytes'], 3) if base['traced_bytes'] else None,
+        })
+    return rows
@@ -0,0 +1,135 @@
+"""按文件内容哈希缓存数据文件中提取的单元格，重复汇总时只解析新增或修改过的文件"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+# 提取逻辑变化时修改该版本号，使旧的缓存失效
+CACHE_VERSION = 1
+
+# 默认缓存位置和容量
+DEFAULT_CACHE_DIR = os.environ.get(
+    'BWT_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'bwt_data_process'))
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+
+
+def content_hash(source):
+    """计算文件内容的sha256，source为bytes（或memoryview）或文件路径"""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def mapping_hash(source_cells):
+    """映射表中源单元格列表的哈希"""
+    payload = json.dumps([CACHE_VERSION, sorted(map(str, source_cells))], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RowCache:
+    """
+    基于SQLite的提取结果缓存
+    以"文件内容哈希 + 映射表哈希"为键保存每个文件提取出的 {源单元格: 值}，
+    总大小超过max_bytes时按最近最少使用的顺序淘汰。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'rows.sqlite')
+        self.max_bytes = max_bytes
+        # 最近一次get_many的命中情况
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rows ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS rows_last_used ON rows (last_used)')
+
+    @contextmanager
+    def _connect(self):
+        """打开连接，正常结束时提交事务，最后关闭连接"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(file_hash, cells_hash):
+        return f'{file_hash}:{cells_hash}'
+
+    def get_many(self, keys):
+        """
+        批量查询缓存
+        Args:
+            keys (list): 缓存键
+        Returns:
+            dict: 命中的 {键: 提取结果}
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._connect() as conn:
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT key, value FROM rows WHERE key IN ({placeholders})', batch).fetchall()
+                found.update((key, pickle.loads(value)) for key, value in rows)
+            if found:
+                now = time.time()
+                conn.executemany('UPDATE rows SET last_used = ? WHERE key = ?',
+                                 [(now, key) for key in found])
+        self.hits = sum(1 for key in keys if key in found)
+        self.misses = len(keys) - self.hits
+        return found
+
+    def put_many(self, items):
+        """批量写入缓存，写入后按容量淘汰旧数据"""
+        now = time.time()
+        records = []
+        for key, value in items:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            records.append((key, blob, len(blob), now))
+        if not records:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO rows (key, value, size, last_used) VALUES (?, ?, ?, ?)', records)
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """总大小超过上限时，从最久未使用的条目开始删除"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM rows').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        to_delete = []
+        for key, size in conn.execute('SELECT key, size FROM rows ORDER BY last_used'):
+            to_delete.append((key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        conn.executemany('DELETE FROM rows WHERE key = ?', to_delete)
+
+    def info(self):
+        """缓存条目数和占用字节数"""
+        with self._connect() as conn:
+            count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM rows').fetchone()
+        return {'entries': count, 'bytes': size, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM rows')
+        with self._connect() as conn:
+            conn.execute('VACUUM')
@@ -0,0 +1,216 @@
+"""
+命令行入口：不启动Streamlit即可运行各数据处理流程
+
+用法示例:
+    python -m bwt_data_process summary --template T.xlsx --inputs dir/ --output out.xlsx
+    python -m bwt_data_process product --template T.xlsx --inputs a.xlsx b.xlsx --output out.xlsx
+    python -m bwt_data_process summary --template T1.xlsx T2.xlsx --inputs dir/ --output out1.xlsx out2.xlsx
+    python -m bwt_data_process m2 --inputs dir/ --output m2_summary.csv
+    python -m bwt_data_process logs --kind alarm --input alarm.xlsx --column 报警类型 --output counts.csv
+    python -m bwt_data_process import-logs --kind status --device PS-01 --inputs logs/
+    python -m bwt_data_process bench --sizes small medium --output bench.json --compare baseline.json
+
+每次运行结束后向标准输出打印一行JSON，包含状态、文件数和各阶段用时；
+指定 --metrics 文件时（放在子命令之前），同时以Prometheus文本格式写出各阶段的耗时和内存。
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date
+
+from .cache import DEFAULT_CACHE_DIR
+from .metrics import metrics_registry, pipeline_run
+
+
+# 退出码
+EXIT_OK = 0
+EXIT_ERROR = 1          # 处理失败
+EXIT_USAGE = 2          # 参数错误（与argparse一致）
+EXIT_PARTIAL = 3        # 部分文件处理失败
+
+
+def collect_inputs(inputs, suffixes):
+    """展开输入参数：目录下按文件名排序取出指定后缀的文件，跳过Excel临时文件"""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            names = sorted(
+                name for name in os.listdir(item)
+                if name.lower().endswith(suffixes) and not name.startswith('~$')
+            )
+            files.extend(os.path.join(item, name) for name in names)
+        else:
+            files.append(item)
+    return files
+
+
+def run_summary(args, run):
+    from .cache import RowCache
+    from .summary import summarize_templates
+
+    kind = 'capa' if args.command == 'summary' else 'product'
+    files = collect_inputs(args.inputs, ('.xlsx',))
+    if not files:
+        raise FileNotFoundError("没有找到需要汇总的xlsx文件")
+    cache = None if args.no_cache else RowCache(args.cache_dir)
+    # 所有模板共用一次读取，以只写模式直接写入输出文件，各阶段在汇总函数中记录
+    results = summarize_templates([(kind, template) for template in args.template], files, args.workers,
+                                  args.output, cache)
+    info = {'files': results[0][1], 'templates': len(results)}
+    if cache is not None:
+        info.update({'cache_hits': cache.hits, 'cache_misses': cache.misses})
+    return info, EXIT_OK
+
+
+def run_m2(args, run):
+    from .m2 import analyze_m2_batch
+
+    files = collect_inputs(args.inputs, ('.csv',))
+    if not files:
+        raise FileNotFoundError("没有找到csv文件")
+    summary = analyze_m2_batch([(os.path.basename(f), f) for f in files], args.workers)
+    with run.stage('serialize', rows=len(summary)):
+        if args.output.lower().endswith('.xlsx'):
+            summary.to_excel(args.output, index=False)
+        else:
+            summary.to_csv(args.output, index=False, encoding='utf-8-sig')
+    failed = int((summary['错误信息'] != '').sum())
+    info = {
+        'files': len(summary),
+        'failed': failed,
+        'qualified': int((summary['是否合格'] == '合格').sum()),
+    }
+    return info, EXIT_PARTIAL if failed else EXIT_OK
+
+
+def run_logs(args, run):
+    from .logs import count_values, describe_status, filter_time_range, frame_memory, load_log, read_log_chunked
+
+    df = read_log_chunked(args.input) if args.kind == 'status' else load_log(args.input)
+    with run.stage('transform', rows=len(df)):
+        start = args.start or df['time'].min().date()
+        end = args.end or df['time'].max().date()
+        filtered_df = filter_time_range(df, start, end)
+        if args.kind == 'status':
+            result = describe_status(filtered_df, args.columns)
+        else:
+            result = count_values(filtered_df, args.column)
+    with run.stage('serialize', rows=len(result)):
+        result.to_csv(args.output, encoding='utf-8-sig')
+    return {'rows': len(filtered_df), 'time_parse': df.attrs.get('time_parse'), 'memory': frame_memory(df)}, EXIT_OK
+
+
+def run_import_logs(args, run):
+    from .log_store import DEFAULT_STORE_DIR, import_log
+
+    files = collect_inputs(args.inputs, ('.xlsx',))
+    if not files:
+        raise FileNotFoundError("没有找到日志xlsx文件")
+    rows = added = 0
+    for path in files:
+        result = import_log(path, args.kind, args.device, args.store_dir or DEFAULT_STORE_DIR)
+        rows += result['rows']
+        added += result['added']
+    return {'files': len(files), 'rows': rows, 'added': added}, EXIT_OK
+
+
+def run_bench(args, run):
+    from .benchmark import compare_results, load_results, run_benchmarks, save_results
+
+    def progress(case):
+        print(f"{case['pipeline']} {case['size']}: {case['best']}s, {case['traced_bytes'] / 1e6:.1f}MB",
+              file=sys.stderr)
+
+    with run.stage('bench'):
+        results = run_benchmarks(args.pipelines, args.sizes, args.data_dir, args.repeat, args.workers, progress)
+    save_results(results, args.output)
+    info = {'cases': len(results['cases']), 'revision': results['revision']}
+    if args.compare:
+        info['compare'] = compare_results(load_results(args.compare), results)
+    return info, EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m bwt_data_process', description="常用数据处理（命令行版本）")
+    parser.add_argument('--metrics', help="运行结束后将各阶段的耗时和内存以Prometheus文本格式写入该文件")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for command, help_text in [('summary', "纠正预防措施汇总"), ('product', "产成品数据汇总")]:
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument('--template', required=True, nargs='+',
+                         help="模板文件，可以指定多个，数据文件只读取一次")
+        sub.add_argument('--inputs', required=True, nargs='+', help="需要汇总的文件或目录")
+        sub.add_argument('--output', required=True, nargs='+', help="输出的xlsx文件，与模板一一对应")
+        sub.add_argument('--workers', type=int, default=None, help="读取数据文件的工作进程数，默认为CPU核心数")
+        sub.add_argument('--no-cache', action='store_true', help="不使用提取结果缓存")
+        sub.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="提取结果缓存目录")
+        sub.set_defaults(handler=run_summary)
+
+    sub = subparsers.add_parser('m2', help="M2数据批量分析")
+    sub.add_argument('--inputs', required=True, nargs='+', help="csv文件或目录")
+    sub.add_argument('--output', required=True, help="输出的汇总表（.csv或.xlsx）")
+    sub.add_argument('--workers', type=int, default=None, help="工作进程数，默认为CPU核心数")
+    sub.set_defaults(handler=run_m2)
+
+    sub = subparsers.add_parser('logs', help="设备日志统计")
+    sub.add_argument('--kind', required=True, choices=['alarm', 'operate', 'status'], help="日志类型")
+    sub.add_argument('--input', required=True, help="日志xlsx文件")
+    sub.add_argument('--output', required=True, help="输出的统计结果csv文件")
+    sub.add_argument('--column', help="报警/操作类型所在列")
+    sub.add_argument('--columns', nargs='+', help="状态日志中需要统计的参数列，默认全部")
+    sub.add_argument('--start', type=date.fromisoformat, help="开始日期 YYYY-MM-DD")
+    sub.add_argument('--end', type=date.fromisoformat, help="结束日期 YYYY-MM-DD")
+    sub.set_defaults(handler=run_logs)
+
+    sub = subparsers.add_parser('import-logs', help="将日志导入本地日志库（Parquet）")
+    sub.add_argument('--kind', required=True, choices=['alarm', 'operate', 'status'], help="日志类型")
+    sub.add_argument('--device', required=True, help="设备名称")
+    sub.add_argument('--inputs', required=True, nargs='+', help="日志xlsx文件或目录")
+    sub.add_argument('--store-dir', default=None, help="日志库根目录")
+    sub.set_defaults(handler=run_import_logs)
+
+    from .benchmark import DEFAULT_DATA_DIR, PIPELINES, SIZES
+
+    sub = subparsers.add_parser('bench', help="用合成数据运行性能基准")
+    sub.add_argument('--output', required=True, help="输出的结果JSON文件")
+    sub.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small'], help="数据规模")
+    sub.add_argument('--pipelines', nargs='+', choices=list(PIPELINES), default=None, help="处理流程，默认全部")
+    sub.add_argument('--repeat', type=int, default=3, help="每个用例的计时次数")
+    sub.add_argument('--workers', type=int, default=1, help="汇总和批量分析的工作进程数")
+    sub.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="合成数据目录，已生成的数据会复用")
+    sub.add_argument('--compare', help="与之前的结果JSON比较")
+    sub.set_defaults(handler=run_bench)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # 参数之间的约束在读取任何文件之前检查，以参数错误（退出码2）退出
+    if args.command == 'logs' and args.kind != 'status' and not args.column:
+        parser.error("报警日志和操作日志需要通过--column指定统计列")
+    if args.command in ('summary', 'product') and len(args.output) != len(args.template):
+        parser.error("--output 的个数需与 --template 相同")
+    report = {'command': args.command}
+    try:
+        with pipeline_run(args.command) as run:
+            info, exit_code = args.handler(args, run)
+        report.update(info)
+        report['status'] = 'ok' if exit_code == EXIT_OK else 'partial'
+    except Exception as e:
+        report['status'] = 'error'
+        report['error'] = str(e)
+        exit_code = EXIT_ERROR
+    report['stages'] = run.stage_seconds()
+    report['elapsed'] = run.seconds
+    report['rss_growth'] = run.rss_growth
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(metrics_registry.prometheus_text())
+    print(json.dumps(report, ensure_ascii=False))
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+报警与状态参数的关联分析
+
+对每次报警，取状态日志中报警前后N秒的窗口。两份日志都按时间排序，
+窗口边界通过二分查找（searchsorted）得到，报警时刻的参数值用merge_asof取得，
+不需要对每次报警扫描整个状态日志。
+"""
+import numpy as np
+import pandas as pd
+
+from .logs import TIME_COLUMN
+
+
+# 一次最多展开的窗口数据行数，超过时分批处理以限制内存
+MAX_GATHER_ROWS = 5_000_000
+
+STATS_COLUMNS = ['报警次数', '有数据的次数', '报警时刻均值', '窗口均值', '窗口标准差',
+                 '窗口最小值', '窗口最大值', '报警前均值', '报警后均值', '前后变化']
+
+
+def _time_values(df):
+    return df[TIME_COLUMN].to_numpy(dtype='datetime64[ns]')
+
+
+def window_bounds(alarm_times, status_times, before, after):
+    """
+    每次报警对应的状态日志行范围
+    Returns:
+        tuple: (lo, mid, hi) 窗口为 [lo, hi)，报警前为 [lo, mid)，报警后为 [mid, hi)
+    """
+    before = np.timedelta64(int(before * 1e9), 'ns')
+    after = np.timedelta64(int(after * 1e9), 'ns')
+    lo = np.searchsorted(status_times, alarm_times - before, side='left')
+    mid = np.searchsorted(status_times, alarm_times, side='left')
+    hi = np.searchsorted(status_times, alarm_times + after, side='right')
+    return lo, mid, hi
+
+
+def _range_sums(prefix, lo, hi):
+    return prefix[hi] - prefix[lo]
+
+
+def _window_min_max(values, lo, hi):
+    """逐次报警计算窗口内的最小值和最大值（忽略NaN），分批展开窗口行"""
+    n = len(lo)
+    mins = np.full(n, np.nan)
+    maxs = np.full(n, np.nan)
+    sizes = hi - lo
+    nonempty = np.flatnonzero(sizes > 0)
+    start = 0
+    while start < len(nonempty):
+        # 按累计行数切分批次
+        cumulative = np.cumsum(sizes[nonempty[start:]])
+        end = start + max(1, int(np.searchsorted(cumulative, MAX_GATHER_ROWS, side='right')))
+        batch = nonempty[start:end]
+        batch_sizes = sizes[batch]
+        offsets = np.concatenate([[0], np.cumsum(batch_sizes)[:-1]])
+        # 展开为窗口内所有行的下标
+        rows = np.repeat(lo[batch] - offsets, batch_sizes) + np.arange(batch_sizes.sum())
+        gathered = values[rows]
+        with np.errstate(invalid='ignore'):
+            mins[batch] = np.fmin.reduceat(gathered, offsets)
+            maxs[batch] = np.fmax.reduceat(gathered, offsets)
+        start = end
+    return mins, maxs
+
+
+def correlate_alarms(alarm_df, status_df, alarm_column, parameters, before=60, after=60, alarm_values=None):
+    """
+    统计每种报警发生前后状态参数的表现
+    Args:
+        alarm_df (pd.DataFrame): 已按时间排序的报警日志
+        status_df (pd.DataFrame): 已按时间排序的状态日志
+        alarm_column (str): 报警类型列
+        parameters (list): 需要统计的状态参数列
+        before (float): 报警前的窗口长度（秒）
+        after (float): 报警后的窗口长度（秒）
+        alarm_values (list): 只统计这些报警类型，默认为全部
+    Returns:
+        pd.DataFrame: 以（报警类型, 参数）为索引的统计表，各次报警的窗口数据合并计算
+    """
+    alarms = alarm_df[[TIME_COLUMN, alarm_column]].dropna()
+    if alarm_values is not None:
+        alarms = alarms[alarms[alarm_column].isin(alarm_values)]
+    if alarms.empty or status_df.empty:
+        return pd.DataFrame(columns=STATS_COLUMNS)
+
+    alarm_times = _time_values(alarms)
+    status_times = _time_values(status_df)
+    lo, mid, hi = window_bounds(alarm_times, status_times, before, after)
+    alarm_types = alarms[alarm_column].astype(str).to_numpy()
+
+    # 报警时刻的参数值：取报警之前最近的一条状态记录，只在报警前的窗口内查找，
+    # 报警时刻不在状态日志覆盖范围内时为空，不会取到很久以前的记录
+    status_part = status_df[list(parameters)].reset_index(drop=True)
+    status_part.insert(0, TIME_COLUMN, status_times)
+    as_of = pd.merge_asof(pd.DataFrame({TIME_COLUMN: alarm_times}), status_part, on=TIME_COLUMN, direction='backward',
+                          tolerance=pd.Timedelta(seconds=before))
+
+    results = []
+    for parameter in parameters:
+        values = pd.to_numeric(status_df[parameter], errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        # 减去参考值后再累加，减小平方和相减时的舍入误差（数值大、波动小的参数尤其明显）
+        reference = values[valid].mean() if valid.any() else 0.0
+        centered = np.where(valid, values - reference, 0.0)
+        # 前缀和：任意窗口内的和、平方和、有效点数都可以O(1)得到
+        prefix_sum = np.concatenate([[0.0], np.cumsum(centered)])
+        prefix_sq = np.concatenate([[0.0], np.cumsum(centered * centered)])
+        prefix_count = np.concatenate([[0], np.cumsum(valid)])
+
+        mins, maxs = _window_min_max(values, lo, hi)
+        per_alarm = pd.DataFrame({
+            'type': alarm_types,
+            'has_data': _range_sums(prefix_count, lo, hi) > 0,
+            'at_alarm': pd.to_numeric(as_of[parameter], errors='coerce').to_numpy(dtype=np.float64),
+            'sum': _range_sums(prefix_sum, lo, hi),
+            'sq': _range_sums(prefix_sq, lo, hi),
+            'count': _range_sums(prefix_count, lo, hi),
+            'before_sum': _range_sums(prefix_sum, lo, mid),
+            'before_count': _range_sums(prefix_count, lo, mid),
+            'after_sum': _range_sums(prefix_sum, mid, hi),
+            'after_count': _range_sums(prefix_count, mid, hi),
+            'min': mins,
+            'max': maxs,
+        })
+        grouped = per_alarm.groupby('type').agg(
+            alarms=('type', 'size'), has_data=('has_data', 'sum'), at_alarm=('at_alarm', 'mean'),
+            sum=('sum', 'sum'), sq=('sq', 'sum'), count=('count', 'sum'),
+            before_sum=('before_sum', 'sum'), before_count=('before_count', 'sum'),
+            after_sum=('after_sum', 'sum'), after_count=('after_count', 'sum'),
+            min=('min', 'min'), max=('max', 'max'))
+
+        count = grouped['count'].where(grouped['count'] > 0)
+        centered_mean = grouped['sum'] / count
+        variance = (grouped['sq'] / count - centered_mean * centered_mean).clip(lower=0)
+        mean = centered_mean + reference
+        before_mean = grouped['before_sum'] / grouped['before_count'].where(grouped['before_count'] > 0) + reference
+        after_mean = grouped['after_sum'] / grouped['after_count'].where(grouped['after_count'] > 0) + reference
+        stats = pd.DataFrame({
+            '报警次数': grouped['alarms'],
+            '有数据的次数': grouped['has_data'].astype('int64'),
+            '报警时刻均值': grouped['at_alarm'],
+            '窗口均值': mean,
+            '窗口标准差': np.sqrt(variance),
+            '窗口最小值': grouped['min'],
+            '窗口最大值': grouped['max'],
+            '报警前均值': before_mean,
+            '报警后均值': after_mean,
+            '前后变化': after_mean - before_mean,
+        })
+        stats.index = pd.MultiIndex.from_product([stats.index, [parameter]], names=['报警类型', '参数'])
+        results.append(stats)
+
+    return pd.concat(results).sort_index()
+
+
+def superposed_profile(alarm_times, status_df, parameter, before=60, after=60, bins=120):
+    """
+    将所有报警对齐到报警时刻，计算参数随相对时间的平均变化曲线
+    Args:
+        alarm_times (array): 报警时间
+        status_df (pd.DataFrame): 已按时间排序的状态日志
+        parameter (str): 状态参数列
+        before, after (float): 窗口长度（秒）
+        bins (int): 相对时间的分段数
+    Returns:
+        pd.DataFrame: 列为 相对时间(秒)、均值、数据点数
+    """
+    alarm_times = np.asarray(alarm_times, dtype='datetime64[ns]')
+    status_times = _time_values(status_df)
+    values = pd.to_numeric(status_df[parameter], errors='coerce').to_numpy(dtype=np.float64)
+    lo, _, hi = window_bounds(alarm_times, status_times, before, after)
+
+    edges = np.linspace(-before, after, bins + 1)
+    sums = np.zeros(bins)
+    counts = np.zeros(bins)
+    sizes = hi - lo
+    start = 0
+    while start < len(lo):
+        cumulative = np.cumsum(sizes[start:])
+        end = start + max(1, int(np.searchsorted(cumulative, MAX_GATHER_ROWS, side='right')))
+        batch_sizes = sizes[start:end]
+        offsets = np.concatenate([[0], np.cumsum(batch_sizes)[:-1]])
+        rows = np.repeat(lo[start:end] - offsets, batch_sizes) + np.arange(batch_sizes.sum())
+        relative = (status_times[rows] - np.repeat(alarm_times[start:end], batch_sizes)) / np.timedelta64(1, 's')
+        batch_values = values[rows]
+        valid = ~np.isnan(batch_values)
+        index = np.clip(np.searchsorted(edges, relative[valid], side='right') - 1, 0, bins - 1)
+        sums += np.bincount(index, weights=batch_values[valid], minlength=bins)
+        counts += np.bincount(index, minlength=bins)
+        start = end
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    return pd.DataFrame({
+        '相对时间(秒)': (edges[:-1] + edges[1:]) / 2,
+        '均值': means,
+        '数据点数': counts.astype('int64'),
+    })
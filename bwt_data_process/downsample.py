@@ -0,0 +1,105 @@
+"""趋势图数据降采样：在保留曲线形状的前提下减少发送到浏览器的数据点"""
+import numpy as np
+
+
+# 默认输出点数（约为图表宽度像素数的两倍）
+DEFAULT_POINTS = 2000
+
+# 点数超过该值时使用WebGL（Scattergl）渲染
+WEBGL_THRESHOLD = 5000
+
+
+def _valid(x, y):
+    """去掉y为NaN的点"""
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x)
+    mask = ~np.isnan(y)
+    if not mask.all():
+        x, y = x[mask], y[mask]
+    return x, y
+
+
+def minmax_downsample(x, y, n_out=DEFAULT_POINTS):
+    """
+    按数据点顺序均分为n_out/2个区间，每个区间保留最小值和最大值所在的点
+    峰值和谷值不会因降采样而丢失。
+    Args:
+        x (array): 横坐标（时间），需已排序
+        y (array): 纵坐标
+        n_out (int): 输出点数上限
+    Returns:
+        tuple: (x, y) 降采样后的数据
+    """
+    x, y = _valid(x, y)
+    n = len(y)
+    if n <= n_out or n_out < 4:
+        return x, y
+
+    n_buckets = n_out // 2
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    sizes = np.diff(edges)
+    starts = edges[:-1]
+    index = np.unique(np.concatenate([
+        _first_match(y, np.minimum.reduceat(y, starts), sizes),
+        _first_match(y, np.maximum.reduceat(y, starts), sizes),
+        [0, n - 1],
+    ]))
+    return x[index], y[index]
+
+
+def _first_match(y, bucket_values, sizes):
+    """每个区间中第一个等于该区间目标值（最小值或最大值）的点的下标"""
+    positions = np.flatnonzero(y == np.repeat(bucket_values, sizes))
+    buckets = np.repeat(np.arange(len(sizes)), sizes)[positions]
+    _, first = np.unique(buckets, return_index=True)
+    return positions[first]
+
+
+def lttb_downsample(x, y, n_out=DEFAULT_POINTS):
+    """
+    Largest-Triangle-Three-Buckets降采样
+    每个区间选取与前一个选中点、下一区间平均点构成三角形面积最大的点，视觉上最接近原曲线。
+    Args:
+        x (array): 横坐标（时间），需已排序
+        y (array): 纵坐标
+        n_out (int): 输出点数
+    Returns:
+        tuple: (x, y) 降采样后的数据
+    """
+    x, y = _valid(x, y)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+
+    # 时间转为数值参与面积计算
+    xf = x.astype('datetime64[ns]').astype(np.int64).astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) \
+        else x.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    index = np.empty(n_out, dtype=np.int64)
+    index[0] = 0
+    index[-1] = n - 1
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xf[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (xf[selected] - avg_x) * (y[start:end] - y[selected])
+            - (xf[selected] - xf[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        index[i + 1] = selected
+    return x[index], y[index]
+
+
+DOWNSAMPLERS = {
+    'minmax': minmax_downsample,
+    'lttb': lttb_downsample,
+}
+
+
+def downsample(x, y, n_out=DEFAULT_POINTS, method='minmax'):
+    """按指定方法降采样，method为 'minmax' 或 'lttb'"""
+    return DOWNSAMPLERS[method](x, y, n_out)
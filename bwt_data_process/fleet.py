@@ -0,0 +1,139 @@
+"""
+多设备对比
+
+每台设备的日志在工作进程中单独加载并汇总为很小的结果（报警次数、参数统计值、
+降采样后的趋势曲线），主进程只合并这些结果，不会同时持有所有设备的完整日志。
+"""
+import io
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .alarm_stats import STATS_KIND, read_buckets, select_buckets
+from .downsample import DEFAULT_POINTS, downsample
+from .log_store import DEFAULT_STORE_DIR, _partition_files, query_logs
+from .logs import TIME_COLUMN, count_values, filter_time_range, load_log, read_log_chunked
+from .metrics import stage
+from .parallel import process_map
+
+
+def store_source(device, store_dir=DEFAULT_STORE_DIR):
+    """日志库中的一台设备"""
+    return ('store', device, store_dir)
+
+
+def file_source(uploaded_file):
+    """上传的一个日志文件，以文件名（不含扩展名）作为设备名称"""
+    name = os.path.splitext(os.path.basename(uploaded_file.name))[0]
+    return ('file', name, uploaded_file.getvalue())
+
+
+def source_device(source):
+    return source[1]
+
+
+def _load(source, kind, start, end, columns=None):
+    """在工作进程中加载一台设备的日志，只保留需要的列和时间范围"""
+    origin, device, payload = source
+    if origin == 'store':
+        start_date = start.date() if start is not None else None
+        end_date = end.date() if end is not None else None
+        df = query_logs(kind, [device], start_date, end_date, columns=columns, store_dir=payload)
+    else:
+        reader = read_log_chunked if kind == 'status' else load_log
+        df = reader(io.BytesIO(payload))
+        if columns is not None:
+            df = df[[TIME_COLUMN] + [col for col in columns if col in df.columns and col != TIME_COLUMN]]
+    if start is not None and end is not None and not df.empty:
+        df = filter_time_range(df, start, end)
+    return df
+
+
+def source_columns(source, kind):
+    """读取一台设备日志的列名（日志库只读Parquet的结构信息，文件只读表头）"""
+    origin, device, payload = source
+    if origin == 'store':
+        files = _partition_files(kind, [device], None, None, payload)
+        return [name for name in pq.read_schema(files[-1][1]).names if name != TIME_COLUMN] if files else []
+    return [str(col) for col in pd.read_excel(io.BytesIO(payload), nrows=0).columns if col != TIME_COLUMN]
+
+
+def device_alarm_counts(task):
+    """
+    一台设备在时间范围内各报警类型的次数（在工作进程中执行）
+    日志库中的设备直接合并导入时保存的小时桶，不读取原始报警记录，时间范围按小时对齐。
+    """
+    source, alarm_column, start, end = task
+    origin, device, payload = source
+    if origin == 'store':
+        start_date = start.date() if start is not None else None
+        end_date = end.date() if end is not None else None
+        paths = [path for _, path in _partition_files(STATS_KIND, [device], start_date, end_date, payload)]
+        buckets = select_buckets(read_buckets(paths), alarm_column, start, end)
+        if not buckets.empty:
+            return device, buckets.groupby('value')['count'].sum()
+    df = _load(source, 'alarm', start, end, [alarm_column])
+    if df.empty or alarm_column not in df.columns:
+        return device, pd.Series(dtype='int64')
+    counts = count_values(df, alarm_column)
+    counts.index = counts.index.astype(str)
+    return device, counts
+
+
+def device_status_summary(task):
+    """
+    一台设备的状态参数统计值和降采样后的趋势曲线（在工作进程中执行）
+    Returns:
+        tuple: (设备名称, 统计表, {参数: (时间, 数值)})
+    """
+    source, parameters, start, end, n_points = task
+    device = source_device(source)
+    df = _load(source, 'status', start, end, parameters)
+    stats = {}
+    series = {}
+    for parameter in parameters:
+        if parameter not in df.columns:
+            continue
+        values = pd.to_numeric(df[parameter], errors='coerce')
+        stats[parameter] = {
+            '数据点数': int(values.count()), '均值': values.mean(), '标准差': values.std(),
+            '最小值': values.min(), '最大值': values.max(),
+        }
+        series[parameter] = downsample(df[TIME_COLUMN].to_numpy(), values.to_numpy(), n_points)
+    table = pd.DataFrame(stats).T
+    if not table.empty:
+        table['数据点数'] = table['数据点数'].astype('int64')
+    return device, table, series
+
+
+def fleet_alarm_counts(sources, alarm_column, start=None, end=None, max_workers=None):
+    """
+    多台设备的报警次数对比
+    Returns:
+        pd.DataFrame: 行为报警类型，列为设备
+    """
+    with stage('extract', files=len(sources)):
+        results = process_map(device_alarm_counts, [(source, alarm_column, start, end) for source in sources],
+                              max_workers)
+    with stage('transform', files=len(results)):
+        table = pd.DataFrame({device: counts for device, counts in results}).fillna(0).astype('int64')
+        if table.empty:
+            return table
+        return table.loc[table.sum(axis=1).sort_values(ascending=False).index]
+
+
+def fleet_status(sources, parameters, start=None, end=None, n_points=DEFAULT_POINTS, max_workers=None):
+    """
+    多台设备的状态参数对比
+    Returns:
+        tuple: (以（设备, 参数）为索引的统计表, {设备: {参数: (时间, 数值)}})
+    """
+    tasks = [(source, list(parameters), start, end, n_points) for source in sources]
+    with stage('extract', files=len(tasks)):
+        results = process_map(device_status_summary, tasks, max_workers)
+    with stage('transform', files=len(results)):
+        stats = {device: device_stats for device, device_stats, _ in results if not device_stats.empty}
+        series = {device: device_series for device, _, device_series in results}
+        table = pd.concat(stats, names=['设备', '参数']) if stats else pd.DataFrame()
+    return table, series
@@ -0,0 +1,181 @@
+"""
+后台任务：耗时较长的汇总在服务进程的线程池中运行，不占用提交任务的页面会话
+
+任务登记在进程内（Streamlit服务进程中所有会话共享），每个任务记录提交者的令牌（owner），
+列出、取消和移除任务时按令牌区分用户；页面断开重连或换一个浏览器标签后，凭同一令牌
+仍可查看进度并取回结果。处理函数需接受 progress 关键字参数，每处理完一个文件调用
+progress(已完成数, 总数)；取消任务时该回调抛出JobCancelled，尚未开始解析的文件不再处理。
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import pipeline_run
+
+
+# 同时运行的任务数，其余任务排队（每个任务内部还会使用进程池并行读取文件）
+MAX_RUNNING_JOBS = 2
+
+# 已结束的任务保留时间（秒），与汇总结果临时文件的保留时间一致
+JOB_TTL = 24 * 3600
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+    # 性能记录中该次运行的状态
+    run_status = 'cancelled'
+
+
+class Job:
+    """一个后台任务的状态、进度和结果"""
+
+    def __init__(self, kind, label, func, args, kwargs, owner=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label
+        self.owner = owner
+        self.status = QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._call = (func, args, kwargs)
+
+    def progress(self, done, total):
+        """传给处理函数的进度回调，已请求取消时抛出JobCancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.done = done
+        self.total = total
+
+    def cancel(self):
+        """请求取消：排队中的任务不再运行，运行中的任务在下一个文件处理完后停止"""
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATES
+
+    @property
+    def elapsed(self):
+        """已运行的秒数，尚未开始时为None"""
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def eta(self):
+        """按已完成文件的平均用时估计的剩余秒数，无法估计时为None"""
+        if self.status != RUNNING or not self.done or not self.total:
+            return None
+        return self.elapsed / self.done * (self.total - self.done)
+
+    def execute(self):
+        if self._cancel.is_set():
+            self.status = CANCELLED
+            self.finished = time.time()
+            self._call = None
+            return
+        self.status = RUNNING
+        self.started = time.time()
+        func, args, kwargs = self._call
+        try:
+            with pipeline_run(self.kind):
+                self.result = func(*args, progress=self.progress, **kwargs)
+            self.status = DONE
+        except JobCancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            self.error = str(e)
+            self.status = FAILED
+        finally:
+            self.finished = time.time()
+            # 释放上传文件的内容
+            self._call = None
+
+
+class JobRunner:
+    """任务登记表和运行任务的线程池（线程安全）"""
+
+    def __init__(self, max_workers=MAX_RUNNING_JOBS, ttl=JOB_TTL):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bwt_job')
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, kind, label, func, *args, owner=None, **kwargs):
+        """
+        提交任务，立即返回
+        Args:
+            kind (str): 任务类型（同时作为性能记录中的流程名）
+            label (str): 显示给用户的说明
+            func: 处理函数，调用方式为 func(*args, progress=..., **kwargs)，返回值保存为任务结果
+            owner (str): 提交者的令牌，只有同一令牌才能列出、取消和移除该任务
+        Returns:
+            Job: 新任务
+        """
+        self._expire()
+        job = Job(kind, label, func, args, kwargs, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(job.execute)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, kind=None, owner=None):
+        """任务列表，最新提交的在前；指定owner时只列出该令牌提交的任务"""
+        self._expire()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        jobs = [job for job in jobs if (kind is None or job.kind == kind) and (owner is None or job.owner == owner)]
+        return sorted(jobs, key=lambda job: job.submitted, reverse=True)
+
+    def cancel(self, job_id, owner):
+        """取消任务，只有提交者（同一令牌）可以取消；返回是否已请求取消"""
+        job = self.get(job_id)
+        if job is None or job.owner != owner:
+            return False
+        job.cancel()
+        return True
+
+    def remove(self, job_id, owner):
+        """从列表中移除已结束的任务，只有提交者（同一令牌）可以移除，运行中的任务不能移除；返回是否已移除"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.owner != owner or job.active:
+                return False
+            del self._jobs[job_id]
+            return True
+
+    def _expire(self):
+        deadline = time.time() - self._ttl
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished is not None and job.finished < deadline]:
+                del self._jobs[job_id]
+
+
+# Streamlit服务进程中所有会话共享的任务登记表
+job_runner = JobRunner()
@@ -0,0 +1,250 @@
+"""
+本地日志库：将导入的日志转换为按设备、按天分区的Parquet文件
+
+目录结构:
+    <根目录>/<日志类型>/device=<设备>/date=<YYYY-MM-DD>/part.parquet
+
+导入时与分区中已有的数据合并，库中已有的记录（时间和内容都相同）不再重复保存，
+重复导入同一文件或导入时间范围重叠的导出文件都不会产生重复数据；
+同一文件中同一秒内重复出现的记录是真实的重复报警，会全部保留。
+"""
+import io
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .alarm_stats import STATS_KIND, alarm_buckets
+from .cache import content_hash
+from .logs import (LOG_KINDS, TIME_COLUMN, compact_columns, index_by_time, load_log, log_cache,
+                   read_log_chunked)
+from .metrics import stage
+
+
+DEFAULT_STORE_DIR = os.environ.get(
+    'BWT_LOG_STORE', os.path.join(os.path.expanduser('~'), '.bwt_data_process', 'log_store'))
+
+# 设备名称中不允许出现的字符（会用作目录名）
+_INVALID_DEVICE_CHARS = re.compile(r'[\\/:*?"<>|=\s]+')
+
+DEVICE_COLUMN = 'device'
+
+# 每个分区合并后的数据文件名
+PARTITION_FILE = 'part.parquet'
+
+# 合并分区时给相同记录编号的临时列
+_OCCURRENCE = '__occurrence'
+
+
+def _check_kind(kind):
+    if kind not in LOG_KINDS:
+        raise ValueError(f"未知的日志类型：{kind}")
+
+
+def normalize_device(device):
+    """规范设备名称，使其可以作为目录名"""
+    device = _INVALID_DEVICE_CHARS.sub('_', str(device).strip()).strip('_')
+    if not device:
+        raise ValueError("设备名称不能为空")
+    return device
+
+
+def _to_arrow_friendly(df):
+    """
+    文本列（含分类列）统一转为字符串类型，避免同一列中混合数字和文本时无法写入Parquet，
+    也避免不同文件中同一列分别写成字典和字符串类型而无法合并读取
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col != TIME_COLUMN and (df[col].dtype == object or isinstance(df[col].dtype, pd.CategoricalDtype)):
+            df[col] = df[col].astype('string')
+    df.columns = [str(col) for col in df.columns]
+    return df
+
+
+def _parquet_files(directory):
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.parquet')]
+
+
+def _replace_partition(partition_dir, table):
+    """把分区（日志或小时桶）写成一个文件，替换其中原有的文件（包括旧版本按源文件哈希命名的文件）"""
+    os.makedirs(partition_dir, exist_ok=True)
+    old_files = _parquet_files(partition_dir)
+    path = os.path.join(partition_dir, PARTITION_FILE)
+    temp_path = path + '.tmp'
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+    for old_path in old_files:
+        if old_path != path:
+            os.remove(old_path)
+
+
+def merge_partition(partition_dir, day_df):
+    """
+    将一天的新数据与分区中已有的数据合并后写回
+    按多重集合比较：同一条记录（时间和内容都相同）在新数据中出现n次、库中已有m次时只新增 max(n - m, 0) 次，
+    重复导入同一文件或时间范围重叠的文件不会产生重复数据，而同一秒内真实重复的记录会全部保留。
+    Returns:
+        tuple: (合并后的整天数据, 新增的行数)
+    """
+    new = _to_arrow_friendly(day_df.reset_index(drop=True))
+    existing = [pq.read_table(path, partitioning=None).to_pandas() for path in _parquet_files(partition_dir)]
+    if existing:
+        stored = _to_arrow_friendly(pd.concat(existing, ignore_index=True))
+        columns = list(dict.fromkeys(list(stored.columns) + list(new.columns)))
+        stored, new = stored.reindex(columns=columns), new.reindex(columns=columns)
+        # 相同记录按出现顺序编号，(记录, 序号) 已在库中的新记录即为重复
+        stored_keys = stored.assign(**{_OCCURRENCE: stored.groupby(columns, dropna=False, sort=False).cumcount()})
+        new_keys = new.assign(**{_OCCURRENCE: new.groupby(columns, dropna=False, sort=False).cumcount()})
+        matched = new_keys.merge(stored_keys, on=columns + [_OCCURRENCE], how='left', indicator=True)['_merge']
+        new = new[(matched == 'left_only').to_numpy()]
+        merged = pd.concat([stored, new], ignore_index=True)
+    else:
+        merged = new
+    merged = merged.sort_values(TIME_COLUMN, kind='stable').reset_index(drop=True)
+    _replace_partition(partition_dir, pa.Table.from_pandas(merged, preserve_index=False))
+    return merged, len(new)
+
+
+def import_log(source, kind, device, store_dir=DEFAULT_STORE_DIR):
+    """
+    将一个日志xlsx文件导入本地日志库
+    Args:
+        source: 文件路径或二进制文件对象
+        kind (str): 日志类型，见LOG_KINDS
+        device (str): 设备名称
+        store_dir (str): 日志库根目录
+    Returns:
+        dict: 导入的行数、新增的行数（去掉库中已有的记录后）、天数和时间列解析统计
+    """
+    _check_kind(kind)
+    device = normalize_device(device)
+    if hasattr(source, 'getvalue'):
+        data = source.getvalue()
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+
+    # 状态日志分块读取并压缩存储，按天转换后写入，不复制整张表
+    reader = read_log_chunked if kind == 'status' else load_log
+    df = reader(io.BytesIO(data))
+    time_parse = df.attrs.get('time_parse')
+    df.columns = [str(col) for col in df.columns]
+    days = df[TIME_COLUMN].dt.strftime('%Y-%m-%d')
+    added = 0
+    for day, day_df in df.groupby(days, sort=True):
+        partition_dir = os.path.join(store_dir, kind, f'device={device}', f'date={day}')
+        with stage('serialize', rows=len(day_df)):
+            merged, day_added = merge_partition(partition_dir, day_df)
+        added += day_added
+        # 报警日志在导入时按合并后的整天数据重新计算小时桶，之后的统计查询只需合并小时桶
+        if kind == 'alarm':
+            with stage('transform', rows=len(merged)):
+                buckets = alarm_buckets(merged)
+            stats_dir = os.path.join(store_dir, STATS_KIND, f'device={device}', f'date={day}')
+            _replace_partition(stats_dir, pa.Table.from_pandas(buckets, preserve_index=False))
+    return {'rows': len(df), 'added': added, 'days': days.nunique(), 'time_parse': time_parse}
+
+
+def list_devices(kind, store_dir=DEFAULT_STORE_DIR):
+    """日志库中某类日志的设备列表"""
+    kind_dir = os.path.join(store_dir, kind)
+    if not os.path.isdir(kind_dir):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(kind_dir) if name.startswith('device='))
+
+
+def list_dates(kind, device, store_dir=DEFAULT_STORE_DIR):
+    """日志库中某设备有数据的日期列表（YYYY-MM-DD）"""
+    device_dir = os.path.join(store_dir, kind, f'device={device}')
+    if not os.path.isdir(device_dir):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(device_dir) if name.startswith('date='))
+
+
+def _partition_files(kind, devices, start_date, end_date, store_dir):
+    """按设备和日期目录筛选分区文件，不需要的分区不会被打开"""
+    start = start_date.isoformat() if start_date else None
+    end = end_date.isoformat() if end_date else None
+    files = []
+    for device in devices:
+        for day in list_dates(kind, device, store_dir):
+            if (start and day < start) or (end and day > end):
+                continue
+            partition_dir = os.path.join(store_dir, kind, f'device={device}', f'date={day}')
+            files.extend(
+                (device, os.path.join(partition_dir, name))
+                for name in sorted(os.listdir(partition_dir)) if name.endswith('.parquet')
+            )
+    return files
+
+
+def query_logs(kind, devices=None, start_date=None, end_date=None, columns=None, store_dir=DEFAULT_STORE_DIR):
+    """
+    从日志库中读取日志
+    Args:
+        kind (str): 日志类型
+        devices (list): 设备名称，默认为全部设备
+        start_date (date): 开始日期（含）
+        end_date (date): 结束日期（含）
+        columns (list): 需要的列，默认为全部列（时间列总会包含）
+        store_dir (str): 日志库根目录
+    Returns:
+        pd.DataFrame: 按时间排序的日志；查询多个设备时增加device列
+    """
+    _check_kind(kind)
+    if devices is None:
+        devices = list_devices(kind, store_dir)
+    files = _partition_files(kind, devices, start_date, end_date, store_dir)
+    if not files:
+        return index_by_time(pd.DataFrame({TIME_COLUMN: pd.Series(dtype='datetime64[ns]')}))
+
+    paths = [path for _, path in files]
+    schema = pa.unify_schemas([pq.read_schema(path) for path in paths], promote_options='permissive')
+    if columns is not None:
+        columns = [TIME_COLUMN] + [col for col in columns if col != TIME_COLUMN and col in schema.names]
+
+    frames = []
+    for device in dict.fromkeys(device for device, _ in files):
+        device_paths = [path for d, path in files if d == device]
+        table = ds.dataset(device_paths, schema=schema, format='parquet').to_table(columns=columns)
+        df = table.to_pandas()
+        if len(devices) > 1:
+            df.insert(1, DEVICE_COLUMN, device)
+        if kind == 'status':
+            df = compact_columns(df)
+        frames.append(df)
+
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if kind == 'status' and len(frames) > 1:
+        # 各设备的分类列取值不同，合并后需重新转换
+        df = compact_columns(df)
+    return index_by_time(df)
+
+
+def query_logs_cached(kind, devices=None, start_date=None, end_date=None, store_dir=DEFAULT_STORE_DIR):
+    """
+    带缓存的query_logs：以查询条件和所涉及分区文件的修改时间为键，
+    日志库有新导入的数据时自动失效
+    """
+    if devices is None:
+        devices = list_devices(kind, store_dir)
+    files = _partition_files(kind, devices, start_date, end_date, store_dir)
+    signature = tuple((path, os.path.getmtime(path)) for _, path in files)
+    key = ('store', kind, tuple(devices), start_date, end_date, signature)
+    df = log_cache.get(key)
+    if df is None:
+        with stage('extract', files=len(files)) as record:
+            df = query_logs(kind, devices, start_date, end_date, store_dir=store_dir)
+            record['rows'] = len(df)
+        df.attrs['source_key'] = content_hash(repr(key).encode('utf-8'))
+        if kind == 'alarm':
+            stats_files = _partition_files(STATS_KIND, devices, start_date, end_date, store_dir)
+            df.attrs['alarm_stats_paths'] = [path for _, path in stats_files]
+        log_cache.put(key, df)
+    return df
@@ -0,0 +1,399 @@
+"""皮秒激光器日志数据的读取与统计（与界面无关）"""
+import io
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from .cache import content_hash
+from .metrics import timed
+
+
+# 日志类型
+LOG_KINDS = ('alarm', 'operate', 'status')
+
+# 时间列名
+TIME_COLUMN = 'time'
+
+# 设备日志中常见的时间格式，按优先顺序尝试
+# 日和月都不超过12时两种写法都能解析，此时按月在前解析，与pandas混合格式（dateutil）的默认规则一致
+TIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y/%m/%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M',
+    '%Y/%m/%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y%m%d %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M:%S',
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    'ISO8601',
+]
+
+# 识别时间格式时使用的样本数
+TIME_SAMPLE_SIZE = 1000
+
+# 分块读取大型日志时每块的行数
+CHUNK_ROWS = 10000
+
+# 已解析日志的内存缓存上限
+LOG_CACHE_MAX_BYTES = int(os.environ.get('BWT_LOG_CACHE_MB', 512)) * 1024 * 1024
+
+
+def index_by_time(df):
+    """
+    按时间排序，并以时间作为索引（DatetimeIndex，不命名以免与time列冲突）
+    排序后时间范围查询可以用二分查找完成，不必扫描整个表。
+    返回新的DataFrame（已排序时为共享数据的浅拷贝），不修改传入的df（可能是缓存中的日志）
+    """
+    if df[TIME_COLUMN].is_monotonic_increasing:
+        df = df.copy(deep=False)
+    else:
+        df = df.sort_values(TIME_COLUMN, kind='stable')
+    df.index = pd.DatetimeIndex(df[TIME_COLUMN].to_numpy())
+    return df
+
+
+def detect_time_format(values, sample_size=TIME_SAMPLE_SIZE):
+    """
+    从样本中识别时间格式
+    Args:
+        values (pd.Series): 时间列
+        sample_size (int): 用于识别的样本数
+    Returns:
+        str: 样本中解析成功最多的格式（成功数相同时取TIME_FORMATS中靠前的），都不成功时返回None
+    """
+    sample = values.dropna()
+    if len(sample) > sample_size:
+        # 从头、中、尾均匀取样，避免只看到文件开头的格式
+        sample = sample.iloc[np.linspace(0, len(sample) - 1, sample_size).astype(int)]
+    sample = sample.astype(str).str.strip()
+    if sample.empty:
+        return None
+
+    best_format, best_count = None, 0
+    for fmt in TIME_FORMATS:
+        count = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if count > best_count:
+            best_format, best_count = fmt, count
+            if count == len(sample):
+                break
+    return best_format
+
+
+def parse_timestamps(values, fmt=None):
+    """
+    解析时间列：先用识别出的固定格式整列向量化解析，只有解析失败的行才逐个按混合格式解析
+    Args:
+        values (pd.Series): 时间列
+        fmt (str): 时间格式，默认从values中识别；分块读取时整个文件使用第一块识别出的格式
+    Returns:
+        tuple: (解析后的datetime列, 统计信息字典)
+    """
+    stats = {'format': None, 'rows': len(values), 'fallback': 0, 'dropped': 0}
+    if pd.api.types.is_datetime64_any_dtype(values):
+        stats['format'] = 'datetime'
+        stats['dropped'] = int(values.isna().sum())
+        return values, stats
+
+    if fmt is None:
+        fmt = detect_time_format(values)
+    stats['format'] = fmt
+    if fmt is not None:
+        parsed = pd.to_datetime(values, format=fmt, errors='coerce')
+    else:
+        parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+
+    failed = parsed.isna() & values.notna()
+    if failed.any():
+        stats['fallback'] = int(failed.sum())
+        parsed[failed] = pd.to_datetime(values[failed], errors='coerce', format='mixed')
+    stats['dropped'] = int(parsed.isna().sum())
+    return parsed, stats
+
+
+def normalize_time(df):
+    """
+    将时间列转换为datetime类型，去掉时间无效的行，并按时间排序建立索引
+    解析统计（识别出的格式、回退解析和丢弃的行数）保存在 df.attrs['time_parse']
+    """
+    df[TIME_COLUMN], stats = parse_timestamps(df[TIME_COLUMN])
+    df = index_by_time(df.dropna(subset=[TIME_COLUMN]))
+    df.attrs['time_parse'] = stats
+    return df
+
+
+@timed('parse', rows=len)
+def load_log(file):
+    """读取日志xlsx文件并规范时间列"""
+    return normalize_time(pd.read_excel(file))
+
+
+def _number_text(value):
+    """已按float32保存的数值转回文本：整数不带小数点，其余取float32能还原的最短写法"""
+    if np.isnan(value):
+        return None
+    if float(value).is_integer():
+        return str(int(value))
+    return str(np.float32(value))
+
+
+class _ColumnBuilder:
+    """
+    分块追加一列数据：第一个含有数据的块决定列的类型，
+    全部可转为数值的列保存为float32，否则保存为分类编码（category）；
+    数值列在之后的块中出现不能转为数值的内容时改为文本列，已读取的数值转为文本，不会丢失数据
+    """
+
+    def __init__(self):
+        self.kind = None
+        self.parts = []
+        self.categories = {}
+        self.rows = 0
+
+    def append(self, values):
+        if self.kind is None and values.notna().any():
+            numeric = pd.to_numeric(values, errors='coerce')
+            self.kind = 'number' if numeric.notna().sum() == values.notna().sum() else 'text'
+            if self.kind == 'number':
+                # 之前的块全为空
+                self.parts = [np.full(self.rows, np.nan, dtype='float32')]
+            else:
+                self.parts = [np.full(self.rows, -1, dtype='int32')]
+        if self.kind == 'number':
+            numeric = pd.to_numeric(values, errors='coerce')
+            if numeric.notna().sum() == values.notna().sum():
+                self.parts.append(numeric.to_numpy(dtype='float32', na_value=np.nan))
+            else:
+                self._switch_to_text()
+        if self.kind == 'text':
+            self._append_text(values)
+        self.rows += len(values)
+
+    def _append_text(self, values):
+        codes, uniques = pd.factorize(values.where(values.isna(), values.astype(str)))
+        mapping = np.array([self.categories.setdefault(value, len(self.categories)) for value in uniques],
+                           dtype='int32')
+        self.parts.append(np.where(codes < 0, -1, mapping[codes] if len(mapping) else -1).astype('int32'))
+
+    def _switch_to_text(self):
+        numbers = np.concatenate(self.parts)
+        self.parts = []
+        self.kind = 'text'
+        self._append_text(pd.Series([_number_text(value) for value in numbers], dtype=object))
+
+    def finish(self):
+        if self.kind == 'text':
+            codes = np.concatenate(self.parts)
+            self.parts = []
+            return pd.Categorical.from_codes(codes, categories=list(self.categories))
+        if self.kind == 'number':
+            values = np.concatenate(self.parts)
+            self.parts = []
+            return values
+        return np.full(self.rows, np.nan, dtype='float32')
+
+
+@timed('parse', rows=len)
+def read_log_chunked(source, chunk_rows=CHUNK_ROWS):
+    """
+    分块读取大型日志xlsx文件（用于状态日志）
+    以只读模式逐行读取活动工作表，每读满chunk_rows行就转换为紧凑的列：数值列为float32，
+    文本列为category，时间无效的行在块内直接丢弃。内存中不会保留整张表的Python对象，
+    峰值占用约为结果大小加一个块。
+    Args:
+        source: 文件路径或二进制文件对象
+        chunk_rows (int): 每块的行数
+    Returns:
+        pd.DataFrame: 时间列已规范并按时间建立索引的日志，解析统计保存在 df.attrs['time_parse']
+    """
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = [f'Unnamed: {i}' if name is None else str(name) for i, name in enumerate(header)]
+        if TIME_COLUMN not in columns:
+            raise KeyError(TIME_COLUMN)
+        time_position = columns.index(TIME_COLUMN)
+        builders = {col: _ColumnBuilder() for col in columns if col != TIME_COLUMN}
+        times = []
+        stats = {'format': None, 'rows': 0, 'fallback': 0, 'dropped': 0}
+        time_format = None
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if not chunk:
+                break
+            frame = pd.DataFrame(chunk)
+            del chunk
+            parsed, chunk_stats = parse_timestamps(frame[time_position], time_format)
+            stats['format'] = stats['format'] or chunk_stats['format']
+            if time_format is None and chunk_stats['format'] in TIME_FORMATS:
+                # 同一文件的各块使用同一格式，不会因为某一块中的日期恰好都不超过12而按另一种格式解析
+                time_format = chunk_stats['format']
+            for key in ('rows', 'fallback', 'dropped'):
+                stats[key] += chunk_stats[key]
+            valid = parsed.notna().to_numpy()
+            times.append(parsed.to_numpy()[valid])
+            for position, col in enumerate(columns):
+                if col == TIME_COLUMN:
+                    continue
+                if position in frame.columns:
+                    values = frame[position][valid]
+                else:
+                    # 行尾的空单元格在只读模式下可能被省略
+                    values = pd.Series([None] * int(valid.sum()), dtype=object)
+                builders[col].append(values.reset_index(drop=True))
+            del frame
+    finally:
+        workbook.close()
+
+    data = {TIME_COLUMN: np.concatenate(times) if times else np.array([], dtype='datetime64[ns]')}
+    del times
+    for col in columns:
+        if col != TIME_COLUMN:
+            data[col] = builders.pop(col).finish()
+    # copy=False：各列保持独立的数组，不再合并复制成一个大块
+    df = index_by_time(pd.DataFrame(data, copy=False))
+    df.attrs['time_parse'] = stats
+    return df
+
+
+def compact_columns(df):
+    """将float64列降为float32、文本列转为category，与read_log_chunked的结果类型一致"""
+    for col in df.columns:
+        if col == TIME_COLUMN:
+            continue
+        dtype = df[col].dtype
+        if dtype == 'float64':
+            df[col] = df[col].astype('float32')
+        elif pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def frame_memory(df):
+    """DataFrame实际占用的内存（字节）"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class FrameCache:
+    """
+    进程内的DataFrame缓存，按最近最少使用的顺序淘汰
+    占用内存按DataFrame的实际大小（memory_usage(deep=True)）计算，
+    超过max_bytes时淘汰最久未使用的条目。缓存的DataFrame被多个会话共享，调用方不应修改。
+    """
+
+    def __init__(self, max_bytes=LOG_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def current_bytes(self):
+        return sum(self._sizes.values())
+
+    def get(self, key):
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return self._frames[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, df):
+        size = frame_memory(df)
+        if size > self.max_bytes:
+            # 单个数据超过上限时不缓存
+            return
+        with self._lock:
+            if key in self._frames:
+                del self._frames[key]
+                del self._sizes[key]
+            self._frames[key] = df
+            self._sizes[key] = size
+            while self.current_bytes > self.max_bytes:
+                old_key, _ = self._frames.popitem(last=False)
+                del self._sizes[old_key]
+
+    def info(self):
+        with self._lock:
+            return {'entries': len(self._frames), 'bytes': self.current_bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._sizes.clear()
+
+
+# Streamlit服务进程中所有会话共享的日志缓存
+log_cache = FrameCache()
+
+
+def load_log_cached(uploaded_file, kind):
+    """
+    读取上传的日志文件，解析和时间规范化的结果按文件内容哈希缓存，
+    页面重新运行时直接复用，不再重复解析xlsx
+    Args:
+        uploaded_file: Streamlit上传的文件
+        kind (str): 日志类型，见LOG_KINDS
+    Returns:
+        pd.DataFrame: 时间列已规范的日志（共享对象，不要修改）
+    """
+    data = uploaded_file.getvalue()
+    key = (kind, content_hash(data))
+    df = log_cache.get(key)
+    if df is None:
+        # 状态日志列多、行多，分块读取并压缩存储
+        reader = read_log_chunked if kind == 'status' else load_log
+        df = reader(io.BytesIO(data))
+        df.attrs['source_key'] = key
+        log_cache.put(key, df)
+    return df
+
+
+def filter_time_range(df, start, end):
+    """
+    按时间范围过滤日志，df需已由index_by_time建立时间索引
+    通过对已排序的时间索引二分查找得到行范围，返回的是原表的切片。
+    Args:
+        df (pd.DataFrame): 日志
+        start (date或datetime): 开始时间；为date时从当天0点开始
+        end (date或datetime): 结束时间（含）；为date时包含当天全部数据
+    Returns:
+        pd.DataFrame: 过滤后的日志
+    """
+    if not isinstance(df.index, pd.DatetimeIndex) or not df.index.is_monotonic_increasing:
+        df = index_by_time(df)
+    if isinstance(start, date) and not isinstance(start, datetime):
+        start = datetime.combine(start, datetime.min.time())
+    if isinstance(end, date) and not isinstance(end, datetime):
+        end_position = df.index.searchsorted(pd.Timestamp(end) + pd.Timedelta(days=1), side='left')
+    else:
+        end_position = df.index.searchsorted(pd.Timestamp(end), side='right')
+    start_position = df.index.searchsorted(pd.Timestamp(start), side='left')
+    return df.iloc[start_position:end_position]
+
+
+def count_values(df, column):
+    """统计某一列各取值出现的次数（报警类型、操作类型等）"""
+    return df[column].value_counts()
+
+
+def describe_status(df, columns=None):
+    """对状态日志的数值参数进行统计"""
+    if columns is None:
+        columns = [col for col in df.columns if col != TIME_COLUMN]
+    return df[columns].describe().T
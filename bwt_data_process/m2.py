@@ -0,0 +1,290 @@
+"""Ophir M2分析仪数据的解析与计算"""
+import csv
+import io
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .metrics import stage, timed
+from .parallel import process_map
+
+# Frame数据段的起始标记（不同版本的导出文件不同），文件中有多个标记时按此顺序优先
+FRAME_MARKERS = ['Frame (Quantitative)', 'Frame Results']
+
+# 圆度合格标准
+ROUNDNESS_CRITERION = 0.9
+
+# M2Result的字段或解析、计算逻辑变化时修改该版本号，使缓存的分析结果失效
+RESULT_VERSION = 1
+
+# Frame数据前三列的类型：光斑宽度用float32，Z位置需要保留精度用float64
+FRAME_DTYPES = {0: np.float32, 1: np.float32, 2: np.float64}
+
+# 没有小节标题的表头行归入该小节
+DEFAULT_SECTION = 'General'
+
+
+@dataclass
+class M2Result:
+    """M2分析结果，所有数组按数据点顺序排列"""
+    z: np.ndarray           # Z Location (mm)
+    width_x: np.ndarray     # Beam Width X (μm)
+    width_y: np.ndarray     # Beam Width Y (μm)
+    roundness: np.ndarray   # 圆度 = min(X, Y) / max(X, Y)
+    waist_index: int        # 束腰（焦点）所在数据点的下标
+    criterion: float = ROUNDNESS_CRITERION
+    metadata: dict = field(default_factory=dict)  # 文件表头信息，按小节分组
+
+    @property
+    def passed(self) -> np.ndarray:
+        """每个数据点是否满足圆度标准"""
+        return self.roundness >= self.criterion
+
+    @property
+    def is_qualified(self) -> bool:
+        """所有数据点是否均合格"""
+        return bool(self.passed.all())
+
+    @property
+    def min_roundness(self) -> float:
+        return float(self.roundness.min())
+
+    @property
+    def waist_z(self) -> float:
+        """焦点位置 (mm)"""
+        return float(self.z[self.waist_index])
+
+    @property
+    def waist_width_x(self) -> float:
+        return float(self.width_x[self.waist_index])
+
+    @property
+    def waist_width_y(self) -> float:
+        return float(self.width_y[self.waist_index])
+
+    @property
+    def waist_roundness(self) -> float:
+        """焦点处的圆度"""
+        return float(self.roundness[self.waist_index])
+
+    def to_frame(self) -> pd.DataFrame:
+        """以DataFrame形式返回逐点数据"""
+        return pd.DataFrame({
+            'Z Location (mm)': self.z,
+            'Beam Width X (μm)': self.width_x,
+            'Beam Width Y (μm)': self.width_y,
+            'roundness': self.roundness,
+            'passed': self.passed,
+        })
+
+
+def _add_metadata_line(metadata, section, fields):
+    """将一行表头信息加入对应小节，返回当前小节名"""
+    fields = [f.strip() for f in fields]
+    while fields and not fields[-1]:
+        fields.pop()
+    if not fields:
+        return section
+    if len(fields) == 1:
+        # 只有一个字段的行视为新小节的标题
+        name = fields[0].rstrip(':')
+        metadata.setdefault(name, {})
+        return name
+    values = fields[1:]
+    metadata.setdefault(section, {})[fields[0].rstrip(':')] = values[0] if len(values) == 1 else values
+    return section
+
+
+def read_m2_csv(stream, encoding='utf-8'):
+    """
+    流式读取Ophir导出的csv文件
+    逐行扫描表头直到Frame标记，之后的数据直接交给pandas按列类型解析，
+    不会把整个文件解码成字符串。文件中同时有多个标记时使用FRAME_MARKERS中靠前的一个：
+    先遇到较低优先级的标记时继续向后查找（只比较字节，不解码），找不到再回到该标记处。
+    Args:
+        stream: 以二进制方式打开的文件对象（或Streamlit上传的文件）
+        encoding (str): 文件编码
+    Returns:
+        tuple: (Frame数据DataFrame, 表头信息字典)
+    """
+    metadata = {}
+    section = DEFAULT_SECTION
+    markers = [marker.encode(encoding) for marker in FRAME_MARKERS]
+    # 目前找到的优先级最高的标记：(在FRAME_MARKERS中的位置, 其后数据的起始位置)
+    found = None
+
+    for raw_line in iter(stream.readline, b''):
+        priority = next((i for i, marker in enumerate(markers) if marker in raw_line), None)
+        if priority is not None:
+            if found is None or priority < found[0]:
+                found = (priority, stream.tell())
+            if priority == 0:
+                break
+        elif found is None:
+            line = raw_line.decode(encoding, errors='replace').lstrip('\ufeff')
+            section = _add_metadata_line(metadata, section, next(csv.reader([line]), []))
+
+    if found is None:
+        raise ValueError("未找到Frame数据部分，请检查文件格式")
+
+    data_start = found[1]
+    stream.seek(data_start)
+    try:
+        df = pd.read_csv(stream, encoding=encoding, usecols=[0, 1, 2], dtype=FRAME_DTYPES)
+    except ValueError:
+        # 数据中夹杂非数值内容时，退回到通用解析，在计算阶段再剔除无效行
+        stream.seek(data_start)
+        df = pd.read_csv(stream, encoding=encoding, usecols=[0, 1, 2])
+
+    return df, metadata
+
+
+def analyze_m2_frame(df, criterion=ROUNDNESS_CRITERION, metadata=None):
+    """
+    对Frame数据进行向量化计算
+    Args:
+        df (pd.DataFrame): 前三列依次为 Beam Width X、Beam Width Y、Z Location
+        criterion (float): 圆度合格标准
+    Returns:
+        M2Result: 计算结果
+    """
+    if df.shape[1] < 3:
+        raise ValueError("Frame数据列数不足，需要包含X/Y光斑宽度和Z位置")
+
+    columns = [
+        pd.to_numeric(df.iloc[:, i], errors='coerce').to_numpy(dtype=dtype)
+        for i, dtype in FRAME_DTYPES.items()
+    ]
+    width_x, width_y, z = columns
+    valid = ~(np.isnan(width_x) | np.isnan(width_y) | np.isnan(z))
+    if not valid.all():
+        width_x, width_y, z = width_x[valid], width_y[valid], z[valid]
+    if len(z) == 0:
+        raise ValueError("Frame数据部分没有有效的数据点")
+
+    roundness = np.minimum(width_x, width_y) / np.maximum(width_x, width_y)
+    # 以X/Y平均宽度最小处作为焦点
+    waist_index = int(np.argmin(width_x + width_y))
+
+    return M2Result(
+        z=z,
+        width_x=width_x,
+        width_y=width_y,
+        roundness=roundness,
+        waist_index=waist_index,
+        criterion=criterion,
+        metadata=metadata or {},
+    )
+
+
+def analyze_m2_stream(stream, criterion=ROUNDNESS_CRITERION):
+    """流式读取导出文件并计算圆度、焦点位置和束腰"""
+    with stage('parse', files=1) as record:
+        df, metadata = read_m2_csv(stream)
+        record['rows'] = len(df)
+    with stage('transform', rows=len(df)):
+        return analyze_m2_frame(df, criterion, metadata)
+
+
+# 绘图代码变化时修改该版本号，使缓存的图片失效
+PLOT_VERSION = 1
+
+
+def plot_m2(result):
+    """根据分析结果绘制光斑宽度与圆度曲线"""
+    import matplotlib.pyplot as plt
+
+    criterion = result.criterion
+
+    # 创建图形
+    fig, ax1 = plt.subplots(figsize=(10, 6))
+
+    # 绘制曲线
+    ax1.plot(result.z, result.width_x, 'r-', label='Beam Width X (μm)')
+    ax1.plot(result.z, result.width_y, 'b-', label='Beam Width Y (μm)')
+
+    # 设置第一个Y轴的标签
+    ax1.set_title('M2 foucs analysis', fontsize=14)
+    ax1.set_xlabel('Z Location (mm)', fontsize=12)
+    ax1.set_ylabel('Beam Width (μm)', fontsize=12)
+    ax1.legend(loc='upper left', fontsize=10)
+    ax1.grid(True)
+
+    # 创建第二个Y轴用于比值
+    ax2 = ax1.twinx()
+    ax2.plot(result.z, result.roundness, 'g--', label='beam roundness')
+
+    # 添加合格标准线
+    ax2.axhline(y=criterion, color='orange', linestyle='-', linewidth=2, alpha=0.7,
+                label=f'Qualification criteria({criterion:g})')
+
+    # 添加合格区域填充
+    ax2.fill_between(result.z, criterion, 1.0, color='lightgreen', alpha=0.3, label='qualified area')
+    ax2.fill_between(result.z, 0.85, criterion, color='pink', alpha=0.3, label='unqualified area')
+
+    ax2.set_ylabel('beam roundness(after focus)', color='g', fontsize=12)
+    ax2.tick_params(axis='y', colors='g')
+    ax2.set_ylim(0.85, 1.0)
+    ax2.legend(loc='upper right', fontsize=10)
+
+    fig.tight_layout()
+    return fig
+
+
+@timed('render')
+def render_m2_png(result, dpi=100, bbox_inches=None):
+    """绘制图表并保存为PNG字节，保存后立即关闭图形，长时间运行时matplotlib占用的内存不会增长"""
+    import matplotlib.pyplot as plt
+
+    fig = plot_m2(result)
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches=bbox_inches)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def summarize_m2_source(source):
+    """
+    分析单个文件并返回汇总行，出错时记录错误信息而不是抛出异常
+    Args:
+        source (tuple): (文件名, 文件内容bytes或文件路径)
+    Returns:
+        dict: 汇总表中的一行
+    """
+    name, data = source
+    row = {'文件名': name, '最小圆度': None, '焦点处圆度': None,
+           '焦点位置(mm)': None, '是否合格': None, '错误信息': ''}
+    try:
+        if isinstance(data, (bytes, bytearray)):
+            result = analyze_m2_stream(io.BytesIO(data))
+        else:
+            with open(data, 'rb') as f:
+                result = analyze_m2_stream(f)
+    except Exception as e:
+        row['错误信息'] = str(e)
+        return row
+
+    row.update({
+        '最小圆度': round(result.min_roundness, 4),
+        '焦点处圆度': round(result.waist_roundness, 4),
+        '焦点位置(mm)': result.waist_z,
+        '是否合格': '合格' if result.is_qualified else '不合格',
+    })
+    return row
+
+
+def analyze_m2_batch(sources, max_workers=None):
+    """
+    在进程池中批量分析M2文件
+    Args:
+        sources (list): (文件名, 文件内容bytes或文件路径) 组成的列表
+        max_workers (int): 工作进程数，默认为CPU核心数
+    Returns:
+        pd.DataFrame: 每个文件一行的汇总表，顺序与输入一致
+    """
+    with stage('extract', files=len(sources)):
+        rows = process_map(summarize_m2_source, sources, max_workers)
+    return pd.DataFrame(rows)
@@ -0,0 +1,311 @@
+"""
+处理流程的分阶段耗时和内存记录
+
+一次处理（一次汇总、一个M2文件、一次日志加载等）用 pipeline_run 包围，
+其中的解析（parse）、提取（extract）、转换（transform）、绘图（render）、写出（serialize）
+等阶段用 stage 上下文管理器或 timed 装饰器标记。当前运行保存在contextvar中，
+数据处理函数只需标记阶段，没有运行时（例如在工作进程中）stage不做任何记录。
+
+每个阶段记录：
+    seconds      耗时（秒）
+    rows/files   处理的行数/文件数（由调用方填写）
+    rss_growth   进程常驻内存峰值在该阶段内的增长；之前已达到更高峰值时为0
+    traced_peak  该阶段内Python分配内存的峰值（相对阶段开始时），只在tracemalloc开启时记录；
+                 设置环境变量 BWT_TRACE_MEMORY=1 后开启，会使处理变慢
+
+结果保存在进程内（Streamlit服务进程中所有会话共享）：最近的若干次运行，以及按流程和阶段累计的统计，
+后者可以导出为Prometheus文本格式。
+"""
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# 保留的最近运行记录数
+RECENT_RUNS = 50
+
+if os.environ.get('BWT_TRACE_MEMORY') and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_current_run = contextvars.ContextVar('bwt_current_run', default=None)
+
+
+def peak_rss_bytes():
+    """进程常驻内存的峰值（字节），无法获取时返回None"""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS上ru_maxrss的单位为字节，Linux上为KB
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Span:
+    """一段被测量的区间：耗时、常驻内存峰值增长和tracemalloc峰值"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.rss_before = peak_rss_bytes()
+        self.tracing = tracemalloc.is_tracing()
+        # 子区间开始时会重置tracemalloc的峰值，重置前的峰值先记到父区间上
+        self.child_peak = 0
+        if self.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None and parent.tracing:
+                parent.child_peak = max(parent.child_peak, peak)
+            tracemalloc.reset_peak()
+            self.traced_base = current
+        self.start = time.perf_counter()
+
+    def finish(self):
+        """结束测量，返回 (耗时, 常驻内存峰值增长, tracemalloc峰值)"""
+        seconds = round(time.perf_counter() - self.start, 4)
+        rss_after = peak_rss_bytes()
+        rss_growth = None if rss_after is None or self.rss_before is None else rss_after - self.rss_before
+        traced_peak = None
+        if self.tracing and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            traced_peak = peak - self.traced_base
+            if self.parent is not None and self.parent.tracing:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+        return seconds, rss_growth, traced_peak
+
+
+class Run:
+    """一次处理的运行记录"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.started = datetime.now()
+        self.status = 'running'
+        self.error = None
+        self.stages = []
+        self.seconds = None
+        self.rss_growth = None
+        self.traced_peak = None
+        self._span = _Span()
+        self._open = [self._span]
+
+    @contextmanager
+    def stage(self, name, rows=None, files=None):
+        """
+        测量一个阶段，返回的记录中可以在阶段内填写 rows/files
+        阶段可以嵌套，depth为嵌套层数（0为最外层）
+        """
+        record = {'stage': name, 'depth': len(self._open) - 1, 'seconds': None, 'rows': rows, 'files': files,
+                  'rss_growth': None, 'traced_peak': None}
+        self.stages.append(record)
+        span = _Span(self._open[-1])
+        self._open.append(span)
+        try:
+            yield record
+        finally:
+            self._open.remove(span)
+            record['seconds'], record['rss_growth'], record['traced_peak'] = span.finish()
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.seconds, self.rss_growth, self.traced_peak = self._span.finish()
+
+    @property
+    def elapsed(self):
+        """到目前为止的耗时（秒）"""
+        return round(time.perf_counter() - self._span.start, 4)
+
+    def stage_seconds(self):
+        """各阶段的耗时 {阶段名: 秒}，同名阶段（例如逐个文件的解析）累加"""
+        seconds = {}
+        for record in self.stages:
+            if record['seconds'] is not None:
+                seconds[record['stage']] = round(seconds.get(record['stage'], 0) + record['seconds'], 4)
+        return seconds
+
+    def as_dict(self):
+        return {
+            'pipeline': self.pipeline,
+            'started': self.started.isoformat(timespec='seconds'),
+            'status': self.status,
+            'error': self.error,
+            'seconds': self.seconds,
+            'rss_growth': self.rss_growth,
+            'traced_peak': self.traced_peak,
+            'peak_rss': peak_rss_bytes(),
+            'stages': [dict(record) for record in self.stages],
+        }
+
+
+class MetricsRegistry:
+    """最近的运行记录和按流程、阶段累计的统计（线程安全）"""
+
+    def __init__(self, max_runs=RECENT_RUNS):
+        self._lock = threading.Lock()
+        self._runs = deque(maxlen=max_runs)
+        # {(流程, 状态): [次数, 总秒数]}
+        self._pipelines = {}
+        # {(流程, 阶段): {'count', 'seconds', 'rows', 'files', 'rss_growth', 'traced_peak'}}
+        self._stages = {}
+
+    def record(self, run):
+        entry = run.as_dict()
+        with self._lock:
+            self._runs.append(entry)
+            totals = self._pipelines.setdefault((run.pipeline, run.status), [0, 0.0])
+            totals[0] += 1
+            totals[1] += run.seconds or 0.0
+            for record in entry['stages']:
+                stats = self._stages.setdefault((run.pipeline, record['stage']), {
+                    'count': 0, 'seconds': 0.0, 'rows': 0, 'files': 0, 'rss_growth': 0, 'traced_peak': 0})
+                stats['count'] += 1
+                stats['seconds'] += record['seconds'] or 0.0
+                stats['rows'] += record['rows'] or 0
+                stats['files'] += record['files'] or 0
+                stats['rss_growth'] = max(stats['rss_growth'], record['rss_growth'] or 0)
+                stats['traced_peak'] = max(stats['traced_peak'], record['traced_peak'] or 0)
+        return entry
+
+    def recent_runs(self, n=None):
+        """最近的运行记录，最新的在前"""
+        with self._lock:
+            runs = list(self._runs)
+        runs.reverse()
+        return runs if n is None else runs[:n]
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+            self._pipelines.clear()
+            self._stages.clear()
+
+    def prometheus_text(self):
+        """按流程和阶段累计的统计，Prometheus文本格式（可供node_exporter的textfile收集器读取）"""
+        with self._lock:
+            pipelines = {key: list(value) for key, value in self._pipelines.items()}
+            stages = {key: dict(value) for key, value in self._stages.items()}
+
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape_label(label)}"' for key, label in labels.items())
+                value = repr(round(value, 6)) if isinstance(value, float) else str(int(value))
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric('bwt_pipeline_runs_total', 'counter', "处理流程的运行次数",
+               [({'pipeline': p, 'status': s}, v[0]) for (p, s), v in sorted(pipelines.items())])
+        metric('bwt_pipeline_seconds_total', 'counter', "处理流程的累计耗时（秒）",
+               [({'pipeline': p, 'status': s}, v[1]) for (p, s), v in sorted(pipelines.items())])
+        stage_metrics = [
+            ('bwt_stage_runs_total', 'counter', 'count', "阶段的执行次数"),
+            ('bwt_stage_seconds_total', 'counter', 'seconds', "阶段的累计耗时（秒）"),
+            ('bwt_stage_rows_total', 'counter', 'rows', "阶段累计处理的行数"),
+            ('bwt_stage_files_total', 'counter', 'files', "阶段累计处理的文件数"),
+            ('bwt_stage_rss_growth_bytes_max', 'gauge', 'rss_growth', "阶段内进程常驻内存峰值增长的最大值（字节）"),
+            ('bwt_stage_traced_peak_bytes_max', 'gauge', 'traced_peak', "阶段内tracemalloc峰值的最大值（字节）"),
+        ]
+        for name, metric_type, field, help_text in stage_metrics:
+            metric(name, metric_type, help_text,
+                   [({'pipeline': p, 'stage': s}, v[field]) for (p, s), v in sorted(stages.items())])
+        peak = peak_rss_bytes()
+        if peak is not None:
+            metric('bwt_process_peak_rss_bytes', 'gauge', "进程常驻内存的峰值（字节）", [({}, peak)])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# 进程内共享的运行记录
+metrics_registry = MetricsRegistry()
+
+
+@contextmanager
+def pipeline_run(pipeline, registry=None):
+    """
+    记录一次处理，处理中的 stage 都记入这次运行
+    没有执行任何阶段的运行（例如页面重新运行时全部命中缓存）不保存，出错的运行总是保存；
+    异常的run_status属性可以指定记录的状态（例如任务取消时为'cancelled'），默认为'error'。
+    Args:
+        pipeline (str): 流程名
+        registry (MetricsRegistry): 保存记录的位置，默认为metrics_registry
+    """
+    run = Run(pipeline)
+    token = _current_run.set(run)
+    status, error = 'interrupted', None
+    try:
+        yield run
+        status = 'ok'
+    except Exception as e:
+        status, error = getattr(e, 'run_status', 'error'), str(e)
+        raise
+    finally:
+        _current_run.reset(token)
+        run.finish(status, error)
+        if run.stages or error is not None:
+            (registry or metrics_registry).record(run)
+
+
+def current_run():
+    """当前线程（上下文）中正在记录的运行，没有时为None"""
+    return _current_run.get()
+
+
+@contextmanager
+def stage(name, rows=None, files=None):
+    """
+    在当前运行中测量一个阶段，没有运行时不做记录
+    Yields:
+        dict: 阶段记录，可以在阶段内填写 rows/files
+    """
+    run = _current_run.get()
+    if run is None:
+        yield {}
+        return
+    with run.stage(name, rows, files) as record:
+        yield record
+
+
+def timed(name, rows=None):
+    """
+    把整个函数作为一个阶段测量的装饰器
+    Args:
+        name (str): 阶段名
+        rows: 由函数返回值得到行数的函数，例如len
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name) as record:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    record['rows'] = rows(result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,50 @@
+"""多进程并行处理的公共函数"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+# 任务数量不超过该值时直接在当前进程中串行处理，避免进程池的启动开销
+SERIAL_THRESHOLD = 2
+
+
+def default_workers():
+    """默认工作进程数：CPU核心数"""
+    return os.cpu_count() or 1
+
+
+def process_map(func, items, max_workers=None, progress=None):
+    """
+    在进程池中对每个元素执行func，结果按输入顺序返回
+    Args:
+        func: 可被pickle的模块级函数
+        items (list): 待处理的元素，每个元素作为func的唯一参数
+        max_workers (int): 工作进程数，默认为CPU核心数
+        progress: 每得到一个结果后调用 progress(已完成数, 总数)；其中抛出的异常会取消尚未开始的任务
+    Returns:
+        list: 与items顺序一致的结果
+    """
+    items = list(items)
+    workers = min(max_workers or default_workers(), len(items))
+    if workers <= 1 or len(items) <= SERIAL_THRESHOLD:
+        results = []
+        for item in items:
+            results.append(func(item))
+            if progress is not None:
+                progress(len(results), len(items))
+        return results
+
+    # Streamlit服务进程中有多个线程，使用spawn避免fork带来的死锁问题
+    context = multiprocessing.get_context('spawn')
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        results = []
+        try:
+            for result in executor.map(func, items, chunksize=chunksize):
+                results.append(result)
+                if progress is not None:
+                    progress(len(results), len(items))
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return results
@@ -0,0 +1,112 @@
+"""
+界面启动优化：较重的依赖在第一次打开用到它们的页面时才导入，并记录首次导入的耗时；
+matplotlib中文字体的选择结果缓存在进程内和磁盘上。
+
+Streamlit每次交互都会重新运行app.py，而本模块只导入一次，其中的记录在进程内一直有效。
+"""
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+
+from .cache import DEFAULT_CACHE_DIR
+
+
+# 进程内各项启动工作（模块首次导入、字体选择）的耗时（秒），按发生顺序
+startup_times = {}
+
+FONT_CACHE_FILE = os.path.join(DEFAULT_CACHE_DIR, 'font.json')
+
+# 不同平台的常用中文字体，按优先顺序
+CHINESE_FONTS = {
+    'Windows': ['SimHei', 'Microsoft YaHei', 'SimSun'],
+    'Darwin': ['PingFang SC', 'Heiti SC', 'STHeiti'],
+    'Linux': ['WenQuanYi Micro Hei', 'Noto Sans CJK SC', 'DejaVu Sans'],
+}
+
+FALLBACK_FONTS = ['DejaVu Sans', 'Arial Unicode MS']
+
+_font = None
+
+
+def preload(modules):
+    """导入尚未导入的模块，并记录每个模块的首次导入耗时（包括它新引入的依赖）"""
+    for name in modules:
+        if name in sys.modules:
+            continue
+        start = time.perf_counter()
+        importlib.import_module(name)
+        startup_times[name] = time.perf_counter() - start
+
+
+def timing_report():
+    """
+    启动耗时报告
+    Returns:
+        list: [(项目, 耗时秒数)]，按耗时从大到小排列
+    """
+    return sorted(startup_times.items(), key=lambda item: item[1], reverse=True)
+
+
+def _font_cache_key():
+    import matplotlib
+    return f"{platform.system()}|{matplotlib.__version__}"
+
+
+def _read_font_cache():
+    try:
+        with open(FONT_CACHE_FILE, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached.get(_font_cache_key())
+
+
+def _write_font_cache(font):
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_FILE), exist_ok=True)
+        with open(FONT_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({_font_cache_key(): font}, f, ensure_ascii=False)
+    except OSError:
+        # 缓存只用于加速，写入失败时下次重新扫描
+        pass
+
+
+def find_chinese_font():
+    """扫描系统字体，返回当前平台第一个可用的中文字体，没有时返回None"""
+    import matplotlib.font_manager as fm
+
+    available_fonts = {f.name for f in fm.fontManager.ttflist}
+    for font in CHINESE_FONTS.get(platform.system(), CHINESE_FONTS['Linux']):
+        if font in available_fonts:
+            return font
+    return None
+
+
+def chinese_font():
+    """
+    当前平台使用的中文字体名称
+    选择结果先在进程内复用，其次读取磁盘缓存（按平台和matplotlib版本区分），都没有时才扫描系统字体。
+    """
+    global _font
+    if _font is None:
+        start = time.perf_counter()
+        _font = _read_font_cache()
+        if _font is None:
+            _font = find_chinese_font() or FALLBACK_FONTS[0]
+            _write_font_cache(_font)
+        startup_times['chinese_font'] = time.perf_counter() - start
+    return _font
+
+
+def setup_chinese_font():
+    """设置matplotlib的中文字体，返回使用的字体名称"""
+    preload(['matplotlib.pyplot'])
+    import matplotlib.pyplot as plt
+
+    font = chinese_font()
+    plt.rcParams['font.sans-serif'] = [font] + [name for name in FALLBACK_FONTS if name != font]
+    plt.rcParams['axes.unicode_minus'] = False
+    return font
@@ -0,0 +1,162 @@
+"""
+状态参数的滚动统计、漂移和异常检测
+
+滚动均值和标准差由累积和（前缀和）加二分查找得到窗口边界计算，全部向量化。
+结果对整份日志计算一次并放入日志缓存，调整显示的时间范围时只需切片，不必重新计算；
+窗口也因此能用到所选范围之前的数据。
+"""
+import numpy as np
+import pandas as pd
+
+from .logs import TIME_COLUMN, filter_time_range, log_cache
+from .metrics import stage
+
+
+# 默认滚动窗口和EWMA半衰期
+DEFAULT_WINDOW = '10min'
+DEFAULT_HALFLIFE = '30min'
+
+# 默认z-score阈值
+DEFAULT_Z = 3.0
+
+# 窗口内至少需要的有效数据点数，少于该值时不计算标准差和z-score
+MIN_WINDOW_POINTS = 3
+
+# 最多返回的异常区间数（按异常点数从多到少）
+MAX_SPANS = 200
+
+TREND_COLUMNS = ['value', 'mean', 'std', 'ewma']
+
+
+def rolling_stats(times, values, window):
+    """
+    按时间窗口 (t - window, t] 计算滚动均值和标准差，忽略NaN
+    Args:
+        times (np.ndarray): 已排序的时间（datetime64[ns]）
+        values (np.ndarray): 参数值
+        window (str或pd.Timedelta): 窗口长度
+    Returns:
+        tuple: (均值, 标准差, 窗口内有效点数)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    # 减去参考值后再累加，减小平方和相减时的舍入误差
+    reference = values[valid].mean() if valid.any() else 0.0
+    centered = np.where(valid, values - reference, 0.0)
+    prefix_sum = np.concatenate([[0.0], np.cumsum(centered)])
+    prefix_sq = np.concatenate([[0.0], np.cumsum(centered * centered)])
+    prefix_count = np.concatenate([[0], np.cumsum(valid)])
+
+    window = np.timedelta64(pd.Timedelta(window).value, 'ns')
+    hi = np.arange(1, len(values) + 1)
+    lo = np.searchsorted(times, times - window, side='right')
+    count = prefix_count[hi] - prefix_count[lo]
+    total = prefix_sum[hi] - prefix_sum[lo]
+    total_sq = prefix_sq[hi] - prefix_sq[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        variance = (total_sq - total * mean) / (count - 1)
+    std = np.sqrt(np.clip(variance, 0, None))
+    std[count < MIN_WINDOW_POINTS] = np.nan
+    return mean + reference, std, count
+
+
+def ewma(times, values, halflife):
+    """按时间半衰期计算指数加权移动平均（不规则采样间隔按实际时间衰减），忽略NaN"""
+    series = pd.Series(np.asarray(values, dtype=np.float64))
+    return series.ewm(halflife=pd.Timedelta(halflife), times=pd.DatetimeIndex(times), ignore_na=True).mean().to_numpy()
+
+
+def parameter_trend(df, parameter, window=DEFAULT_WINDOW, halflife=DEFAULT_HALFLIFE):
+    """
+    对整份日志计算某个参数的滚动统计和EWMA，结果在日志缓存中复用
+    Returns:
+        pd.DataFrame: 与df同索引，列为 value, mean, std, ewma（float32）
+    """
+    source_key = df.attrs.get('source_key')
+    key = ('status_trend', source_key, parameter, str(window), str(halflife))
+    if source_key is not None:
+        trend = log_cache.get(key)
+        if trend is not None:
+            return trend
+
+    with stage('transform', rows=len(df)):
+        times = df[TIME_COLUMN].to_numpy(dtype='datetime64[ns]')
+        values = pd.to_numeric(df[parameter], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        mean, std, _ = rolling_stats(times, values, window)
+        trend = pd.DataFrame({
+            TIME_COLUMN: df[TIME_COLUMN].to_numpy(),
+            'value': values,
+            'mean': mean,
+            'std': std,
+            'ewma': ewma(times, values, halflife),
+        }, index=df.index)
+        trend[TREND_COLUMNS] = trend[TREND_COLUMNS].astype('float32')
+
+    if source_key is not None:
+        log_cache.put(key, trend)
+    return trend
+
+
+def flag_anomalies(trend, z_threshold=DEFAULT_Z, lower=None, upper=None):
+    """
+    标记异常点：偏离滚动均值超过z_threshold个标准差，或超出上下限
+    Returns:
+        pd.DataFrame: trend加上 z, drift（EWMA相对范围起点的变化）, flag 列
+    """
+    trend = trend.copy()
+    values = trend['value'].to_numpy(dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (values - trend['mean'].to_numpy(dtype=np.float64)) / trend['std'].to_numpy(dtype=np.float64)
+    z[~np.isfinite(z)] = np.nan
+    flag = np.abs(np.nan_to_num(z)) > z_threshold
+    if lower is not None:
+        flag |= values < lower
+    if upper is not None:
+        flag |= values > upper
+    ewma_values = trend['ewma'].to_numpy(dtype=np.float64)
+    first = np.flatnonzero(~np.isnan(ewma_values))
+    trend['z'] = z.astype('float32')
+    trend['drift'] = (ewma_values - ewma_values[first[0]] if len(first) else ewma_values).astype('float32')
+    trend['flag'] = flag
+    return trend
+
+
+def anomaly_spans(times, flags, merge_gap=None, max_spans=MAX_SPANS):
+    """
+    将连续的异常点合并为区间，间隔不超过merge_gap的相邻区间也合并
+    Returns:
+        pd.DataFrame: 每个区间一行：开始时间、结束时间、异常点数；超过max_spans个时保留异常点数最多的区间
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    flags = np.asarray(flags, dtype=bool)
+    edges = np.diff(np.concatenate([[False], flags, [False]]).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    if len(starts) and merge_gap is not None:
+        gap = np.timedelta64(pd.Timedelta(merge_gap).value, 'ns')
+        # 与前一个区间相距超过merge_gap时开始新的区间
+        new_span = np.concatenate([[True], times[starts[1:]] - times[ends[:-1]] > gap])
+        span_ids = np.cumsum(new_span) - 1
+        points = np.bincount(span_ids, weights=ends - starts + 1).astype(np.int64)
+        starts = starts[new_span]
+        ends = ends[np.concatenate([new_span[1:], [True]])]
+    else:
+        points = ends - starts + 1
+    spans = pd.DataFrame({'开始时间': times[starts], '结束时间': times[ends], '异常点数': points})
+    if len(spans) > max_spans:
+        spans = spans.loc[spans['异常点数'].sort_values(ascending=False, kind='stable').index[:max_spans]]
+    return spans.sort_values('开始时间').reset_index(drop=True)
+
+
+def analyze_trend(df, parameter, start, end, window=DEFAULT_WINDOW, halflife=DEFAULT_HALFLIFE,
+                  z_threshold=DEFAULT_Z, lower=None, upper=None, merge_gap=None):
+    """
+    某个参数在时间范围内的滚动统计、漂移和异常区间
+    Returns:
+        tuple: (逐点结果, 异常区间表)
+    """
+    trend = filter_time_range(parameter_trend(df, parameter, window, halflife), start, end)
+    trend = flag_anomalies(trend, z_threshold, lower, upper)
+    spans = anomaly_spans(trend[TIME_COLUMN].to_numpy(), trend['flag'].to_numpy(), merge_gap)
+    return trend, spans
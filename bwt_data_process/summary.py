@@ -0,0 +1,461 @@
+"""纠正预防措施汇总与产成品数据汇总（与界面无关）"""
+import io
+import os
+import tempfile
+import time
+from copy import copy
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Border, NamedStyle, Side
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.page import PageMargins, PrintOptions, PrintPageSetup
+
+from .cache import content_hash, mapping_hash
+from .metrics import stage
+from .parallel import process_map
+from .xlsx_cells import read_cells, split_address
+
+
+# 模板中映射表所在的行
+CAPA_MAPPING_ROW = 4
+PRODUCT_MAPPING_ROW = 1
+
+# 产成品汇总中日期单元格的格式
+PRODUCT_DATE_FORMAT = 'yyyy/mm/dd'
+
+
+def round_to_decimal(value: str, decimal_places: int) -> float:
+    """
+    将字符串数值四舍五入到指定小数位数
+    Args:
+        value (str): 需要四舍五入的字符串数值
+        decimal_places (int): 四舍五入后保留的小数位数
+    Returns:
+        float: 四舍五入后的浮点数
+    """
+    format_str = '0.' + '0' * decimal_places
+    return float(Decimal(value).quantize(Decimal(format_str), rounding=ROUND_HALF_UP))
+
+
+def file_display_name(data_file):
+    """获取文件名：支持Streamlit上传的文件和文件路径"""
+    return os.path.basename(getattr(data_file, 'name', None) or str(data_file))
+
+
+def read_mapping(ws, mapping_row):
+    """读取模板中的映射表：{目标列字母: 源单元格地址}"""
+    mapping = {}
+    for col in range(1, ws.max_column + 1):
+        col_letter = get_column_letter(col)
+        cell_value = ws.cell(row=mapping_row, column=col).value
+        if cell_value is not None:
+            mapping[col_letter] = cell_value
+    return mapping
+
+
+def _as_source(data_file):
+    """将上传的文件转换为可传给工作进程的内容：文件对象取出bytes，路径保持不变"""
+    if hasattr(data_file, 'getvalue'):
+        return data_file.getvalue()
+    return data_file
+
+
+def extract_cells(task):
+    """
+    读取一个数据文件中映射表用到的单元格（在工作进程中执行）
+    优先直接解析xlsx中的XML，只读取需要的单元格；文件无法按此方式解析时退回openpyxl。
+    Args:
+        task (tuple): (文件bytes或路径, 源单元格地址列表)
+    Returns:
+        dict: {源单元格地址: 单元格的值}
+    """
+    source, source_cells = task
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        return read_cells(source, source_cells)
+    except Exception:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+    return _extract_cells_openpyxl(source, source_cells)
+
+
+def _extract_cells_openpyxl(source, source_cells):
+    """使用openpyxl完整加载工作簿后读取单元格"""
+    load_wb = load_workbook(source, data_only=True)
+    try:
+        values = {}
+        for address in source_cells:
+            sheet, cell = split_address(address)
+            load_sheet = load_wb.active if sheet is None else load_wb[sheet]
+            values[address] = load_sheet[cell].value
+        return values
+    finally:
+        load_wb.close()
+
+
+def extract_rows(data_files, mapping, max_workers=None, cache=None, progress=None):
+    """
+    并行读取所有数据文件中映射表用到的单元格，结果按上传顺序返回
+    Args:
+        data_files (list): 数据文件（路径或文件对象）
+        mapping (dict或list): 模板映射表 {目标列字母: 源单元格地址}，多个模板时为映射表的列表
+        max_workers (int): 工作进程数，默认为CPU核心数
+        cache (RowCache): 提取结果缓存，命中的文件不再解析
+        progress: 进度回调 progress(已完成文件数, 文件总数)，缓存命中的文件算作已完成
+    Returns:
+        list: 每个文件一个 {源单元格地址: 值} 字典
+    """
+    mappings = mapping if isinstance(mapping, list) else [mapping]
+    source_cells = list(dict.fromkeys(cell for m in mappings for cell in m.values() if cell is not None))
+    sources = [_as_source(data_file) for data_file in data_files]
+    if cache is None:
+        with stage('extract', files=len(sources)):
+            return process_map(extract_cells, [(source, source_cells) for source in sources], max_workers, progress)
+
+    cells_hash = mapping_hash(source_cells)
+    keys = [cache.make_key(content_hash(source), cells_hash) for source in sources]
+    cached = cache.get_many(keys)
+
+    # 只解析缓存中没有的文件（内容相同的文件只解析一次）
+    missing = list(dict.fromkeys(key for key in keys if key not in cached))
+    source_by_key = dict(zip(keys, sources))
+    if progress is not None:
+        # 缓存命中的文件直接计入已完成
+        done = len(keys) - len(missing)
+        progress(done, len(keys))
+
+        def file_progress(n, total):
+            progress(done + n, done + total)
+    else:
+        file_progress = None
+    with stage('extract', files=len(missing)):
+        extracted = process_map(extract_cells, [(source_by_key[key], source_cells) for key in missing], max_workers,
+                                file_progress)
+    new_rows = dict(zip(missing, extracted))
+    cache.put_many(new_rows.items())
+
+    cached.update(new_rows)
+    return [cached[key] for key in keys]
+
+
+def _capa_row_values(row, data_file, mapping, source_values):
+    """纠正预防措施汇总中一行的内容：{目标列字母: 值}"""
+    # 写入序号和文件名
+    values = {'A': row-5, 'B': file_display_name(data_file)}
+
+    # 根据映射表处理数据
+    for target_cell, source_cell in mapping.items():
+        if source_cell is not None:
+            source_value = source_values[source_cell]
+            if isinstance(source_value, datetime):
+                source_value = source_value.strftime('%Y/%m/%d')
+            values[target_cell] = source_value
+    return values
+
+
+def _product_row_values(row, data_file, mapping, source_values):
+    """产成品数据汇总中一行的内容：{目标列字母: 值}"""
+    # 写入序号和文件名
+    values = {'A': row-1, 'B': file_display_name(data_file)}
+
+    # 根据映射表处理数据
+    for target_cell, source_cell in mapping.items():
+        if source_cell is not None:
+            source_value = source_values[source_cell]
+            values[target_cell] = source_value
+
+            # 特殊处理AR列（功率范围）
+            if target_cell == 'AR':
+                var1, var2 = source_value.split('-')
+                var1 = int(var1[:-3])
+                var2 = int(var2[:-5])
+                values['AR'] = var1
+                values['AS'] = var2
+
+            # 特殊处理AT列（功率计算）
+            elif target_cell == 'AT':
+                power = values['AT']
+                values['AU'] = round_to_decimal(power / var1 * 1000, 0)
+    return values
+
+
+def _write_rows_in_place(ws, rows_values, date_format=None):
+    """将汇总行依次写入模板工作表的末尾"""
+    for row, values in rows_values:
+        for target_cell, value in values.items():
+            cell = ws[f'{target_cell}{row}']
+            cell.value = value
+
+            # 如果是日期类型，设置日期格式
+            if date_format and isinstance(value, datetime):
+                cell.number_format = date_format
+
+
+def _copy_cell_style(source, target):
+    """复制单元格样式"""
+    if source.has_style:
+        target.font = copy(source.font)
+        target.fill = copy(source.fill)
+        target.border = copy(source.border)
+        target.alignment = copy(source.alignment)
+        target.protection = copy(source.protection)
+        target.number_format = source.number_format
+
+
+def _can_stream(wb, ws):
+    """
+    模板能否用只写模式生成：只写模式只复制活动工作表的内容、样式、列宽、行高、合并单元格和冻结窗格，
+    模板有多个工作表或用到了其他功能（数据验证、条件格式、打印设置等）时只能在模板上直接写入
+    """
+    if len(wb.worksheets) + len(wb.chartsheets) > 1 or wb.defined_names or ws.defined_names:
+        return False
+    if ws.data_validations.dataValidation or len(ws.conditional_formatting) or ws.tables or ws.auto_filter.ref:
+        return False
+    if ws._images or ws._charts or ws._hyperlinks or ws.legacy_drawing or ws.protection.sheet:
+        return False
+    if ws.print_area or ws.print_title_rows or ws.print_title_cols or ws.HeaderFooter:
+        return False
+    if (ws.page_setup != PrintPageSetup() or ws.page_margins != PageMargins()
+            or ws.print_options != PrintOptions()):
+        return False
+    return not any(cell.comment is not None for row in ws.iter_rows() for cell in row)
+
+
+def _write_rows_streaming(ws, rows_values, output_path, date_format=None, border=None):
+    """
+    以只写模式生成汇总文件并直接写入磁盘（模板需满足_can_stream）
+    模板工作表的内容、样式、列宽、行高、合并单元格和冻结窗格会被保留，
+    新增行使用共享的命名样式，不再为每个单元格创建样式对象。
+    """
+    rows_values = list(rows_values)
+    max_column = ws.max_column
+    for _, values in rows_values:
+        for target_cell in values:
+            max_column = max(max_column, column_index_from_string(target_cell))
+
+    out_wb = Workbook(write_only=True)
+    out_ws = out_wb.create_sheet(ws.title)
+
+    # 命名样式：普通单元格和日期单元格
+    cell_style = NamedStyle(name='summary_cell')
+    date_style = NamedStyle(name='summary_date', number_format=date_format or 'General')
+    if border is not None:
+        cell_style.border = border
+        date_style.border = border
+    out_wb.add_named_style(cell_style)
+    out_wb.add_named_style(date_style)
+
+    for key, dimension in ws.column_dimensions.items():
+        if dimension.width:
+            out_ws.column_dimensions[key].width = dimension.width
+    for key, dimension in ws.row_dimensions.items():
+        if dimension.height:
+            out_ws.row_dimensions[key].height = dimension.height
+    out_ws.merged_cells = MultiCellRange([str(merged) for merged in ws.merged_cells.ranges])
+    out_ws.freeze_panes = ws.freeze_panes
+
+    # 复制模板中的已有行
+    for template_row in ws.iter_rows(max_col=max_column):
+        out_row = []
+        for cell in template_row:
+            out_cell = WriteOnlyCell(out_ws, value=cell.value)
+            _copy_cell_style(cell, out_cell)
+            out_row.append(out_cell)
+        out_ws.append(out_row)
+
+    # 写入汇总行
+    styled = border is not None or date_format is not None
+    for _, values in rows_values:
+        out_row = [None] * max_column
+        for target_cell, value in values.items():
+            out_row[column_index_from_string(target_cell) - 1] = value
+        if styled:
+            for index, value in enumerate(out_row):
+                is_date = date_format is not None and isinstance(value, datetime)
+                if border is None and not is_date:
+                    continue
+                out_cell = WriteOnlyCell(out_ws, value=value)
+                out_cell.style = date_style.name if is_date else cell_style.name
+                out_row[index] = out_cell
+        out_ws.append(out_row)
+
+    out_wb.save(output_path)
+    return output_path
+
+
+def _save_in_place(wb, output_path=None):
+    """保存处理后的文件：指定output_path时写入该文件，否则保存到内存"""
+    if output_path is not None:
+        wb.save(output_path)
+        return output_path
+    output_buffer = io.BytesIO()
+    wb.save(output_buffer)
+    output_buffer.seek(0)
+    return output_buffer
+
+
+def _load_template(template_file, mapping_row):
+    """读取模板文件和其中的映射表"""
+    with stage('parse', files=1):
+        wb = load_workbook(template_file)
+        ws = wb.active
+        return wb, ws, read_mapping(ws, mapping_row)
+
+
+def _capa_output(wb, ws, mapping, data_files, source_rows, output_path=None):
+    """按纠正预防措施模板写出汇总结果"""
+    with stage('transform', rows=len(data_files)):
+        # 从第5行开始写入数据
+        start_row = ws.max_row + 1
+        rows_values = [
+            (row, _capa_row_values(row, data_file, mapping, source_values))
+            for row, (data_file, source_values) in enumerate(zip(data_files, source_rows), start_row)
+        ]
+    processed_files_count = len(rows_values)
+
+    with stage('serialize', rows=processed_files_count):
+        if output_path is not None and _can_stream(wb, ws):
+            return _write_rows_streaming(ws, rows_values, output_path), processed_files_count
+
+        _write_rows_in_place(ws, rows_values)
+
+        # 保存处理后的文件
+        return _save_in_place(wb, output_path), processed_files_count
+
+
+def _product_output(wb, ws, mapping, data_files, source_rows, output_path=None):
+    """按产成品模板写出汇总结果"""
+    with stage('transform', rows=len(data_files)):
+        # 从最后一行开始写入数据
+        start_row = ws.max_row + 1
+        rows_values = [
+            (row, _product_row_values(row, data_file, mapping, source_values))
+            for row, (data_file, source_values) in enumerate(zip(data_files, source_rows), start_row)
+        ]
+    processed_files_count = len(rows_values)
+
+    # 边框
+    thin_border = Border(
+        left=Side(style='thin', color='000000'),
+        right=Side(style='thin', color='000000'),
+        top=Side(style='thin', color='000000'),
+        bottom=Side(style='thin', color='000000')
+    )
+
+    with stage('serialize', rows=processed_files_count):
+        if output_path is not None and _can_stream(wb, ws):
+            output_path = _write_rows_streaming(ws, rows_values, output_path,
+                                                date_format=PRODUCT_DATE_FORMAT, border=thin_border)
+            return output_path, processed_files_count
+
+        _write_rows_in_place(ws, rows_values, date_format=PRODUCT_DATE_FORMAT)
+
+        # 只为新添加的行添加边框
+        for row in range(ws.max_row - processed_files_count + 1, ws.max_row + 1):
+            for col in range(1, ws.max_column + 1):
+                ws.cell(row=row, column=col).border = thin_border
+
+        # 保存处理后的文件
+        return _save_in_place(wb, output_path), processed_files_count
+
+
+# 汇总类型：(映射表所在行, 写出函数)
+SUMMARY_KINDS = {
+    'capa': (CAPA_MAPPING_ROW, _capa_output),
+    'product': (PRODUCT_MAPPING_ROW, _product_output),
+}
+
+
+def summarize_templates(templates, data_files, max_workers=None, output_paths=None, cache=None, progress=None):
+    """
+    同时填写多个汇总模板：所有模板映射表用到的单元格合并后，每个数据文件只打开和解析一次
+    映射表中的源单元格地址可以带工作表名（如 'Sheet2!B3'），不带时读取活动工作表。
+    Args:
+        templates (list): (汇总类型, 模板文件) 列表，类型见SUMMARY_KINDS：'capa'为纠正预防措施，'product'为产成品
+        data_files (list): 需要汇总的数据文件（路径或文件对象）
+        max_workers (int): 读取数据文件的工作进程数，默认为CPU核心数
+        output_paths (list): 与templates一一对应的输出文件，其中为None的结果保存在内存中；默认全部保存在内存中
+        cache (RowCache): 提取结果缓存
+        progress: 读取数据文件的进度回调 progress(已完成文件数, 文件总数)，见extract_rows
+    Returns:
+        list: 与templates一一对应的 (汇总结果BytesIO或输出文件路径, 处理的文件数)
+    """
+    for kind, _ in templates:
+        if kind not in SUMMARY_KINDS:
+            raise ValueError(f"未知的汇总类型：{kind}")
+    if output_paths is None:
+        output_paths = [None] * len(templates)
+    elif len(output_paths) != len(templates):
+        raise ValueError("输出文件的个数与模板的个数不一致")
+
+    loaded = [(kind, *_load_template(template_file, SUMMARY_KINDS[kind][0])) for kind, template_file in templates]
+
+    # 并行读取所有数据文件（所有模板共用一次读取）
+    source_rows = extract_rows(data_files, [mapping for _, _, _, mapping in loaded], max_workers, cache, progress)
+
+    return [
+        SUMMARY_KINDS[kind][1](wb, ws, mapping, data_files, source_rows, output_path)
+        for (kind, wb, ws, mapping), output_path in zip(loaded, output_paths)
+    ]
+
+
+def summarize_capa_data(template_file, data_files, max_workers=None, output_path=None, cache=None, progress=None):
+    """
+    纠正预防措施汇总：按模板第4行的映射表，将每个数据文件汇总为模板中的一行
+    Args:
+        template_file: 模板文件（路径或文件对象）
+        data_files (list): 需要汇总的数据文件（路径或文件对象）
+        max_workers (int): 读取数据文件的工作进程数，默认为CPU核心数
+        output_path (str): 指定时将结果直接写入该文件（单工作表的简单模板用只写模式生成，见_can_stream）
+        cache (RowCache): 提取结果缓存
+        progress: 读取数据文件的进度回调 progress(已完成文件数, 文件总数)，见extract_rows
+    Returns:
+        tuple: (汇总结果BytesIO或output_path, 处理的文件数)
+    """
+    return summarize_templates([('capa', template_file)], data_files, max_workers, [output_path], cache, progress)[0]
+
+
+def summarize_product_data(template_file, data_files, max_workers=None, output_path=None, cache=None, progress=None):
+    """
+    产成品数据汇总：按模板第1行的映射表，将每个数据文件汇总为模板中的一行
+    Args:
+        template_file: 模板文件（路径或文件对象）
+        data_files (list): 需要汇总的数据文件（路径或文件对象）
+        max_workers (int): 读取数据文件的工作进程数，默认为CPU核心数
+        output_path (str): 指定时将结果直接写入该文件（单工作表的简单模板用只写模式生成，见_can_stream）
+        cache (RowCache): 提取结果缓存
+        progress: 读取数据文件的进度回调 progress(已完成文件数, 文件总数)，见extract_rows
+    Returns:
+        tuple: (汇总结果BytesIO或output_path, 处理的文件数)
+    """
+    return summarize_templates([('product', template_file)], data_files, max_workers, [output_path], cache,
+                               progress)[0]
+
+
+def new_output_path(prefix, max_age=24 * 3600):
+    """
+    在临时目录中为汇总结果分配一个文件路径，同时清理超过max_age秒的旧结果
+    Args:
+        prefix (str): 文件名前缀
+        max_age (int): 旧文件保留时间（秒）
+    Returns:
+        str: 新文件路径
+    """
+    output_dir = os.path.join(tempfile.gettempdir(), 'bwt_data_process_outputs')
+    os.makedirs(output_dir, exist_ok=True)
+    now = time.time()
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            pass
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix='.xlsx', dir=output_dir)
+    os.close(fd)
+    return path
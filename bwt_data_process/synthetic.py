@@ -0,0 +1,202 @@
+"""
+确定性的合成测试数据：Ophir M2导出文件、检验报告xlsx及其汇总模板、设备日志
+
+所有生成器都使用固定的随机种子，相同参数总是生成内容相同的文件，
+不同版本的性能基准因此可以直接比较。
+"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from openpyxl import Workbook
+
+from .summary import CAPA_MAPPING_ROW, PRODUCT_MAPPING_ROW
+
+
+# 生成规则变化时修改该版本号，已生成的数据文件会重新生成
+GENERATOR_VERSION = 1
+
+DEFAULT_SEED = 0
+
+# 检验报告中被汇总的单元格：文本、数值和日期
+REPORT_TEXT_CELLS = [f'B{row}' for row in range(2, 12)]
+REPORT_NUMBER_CELLS = [f'C{row}' for row in range(2, 12)]
+REPORT_DATE_CELL = 'D2'
+# 产成品汇总中需要特殊处理的功率范围和功率
+REPORT_POWER_RANGE_CELL = 'E1'
+REPORT_POWER_CELL = 'E2'
+
+LOG_START = datetime(2025, 1, 1)
+
+
+def _rng(seed, *salt):
+    return np.random.default_rng([seed, *salt])
+
+
+def write_ophir_csv(path, n_frames, seed=DEFAULT_SEED):
+    """
+    生成Ophir M2导出文件：表头信息 + Frame数据段（光斑宽度X/Y随Z按高斯光束规律变化）
+    Args:
+        path (str): 输出的csv文件
+        n_frames (int): Frame数据点数
+        seed (int): 随机种子
+    """
+    rng = _rng(seed, n_frames)
+    z = np.linspace(-10.0, 10.0, n_frames)
+    waist = 50.0 * np.sqrt(1 + ((z - 0.5) / 3.0) ** 2)
+    width_x = waist * (1 + rng.normal(0, 0.01, n_frames))
+    width_y = waist * (0.96 + rng.normal(0, 0.01, n_frames))
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write("Header\nOperator,bench\nDevice,BeamSquared\nSetup\nWavelength,1064\nLens,200\n")
+        f.write("Frame (Quantitative)\nBeam Width X,Beam Width Y,Z Location\n")
+        np.savetxt(f, np.column_stack([width_x, width_y, z]), fmt=['%.3f', '%.3f', '%.4f'], delimiter=',')
+
+
+def write_report_templates(directory):
+    """
+    生成两种汇总模板，映射表引用检验报告中的单元格
+    Returns:
+        tuple: (纠正预防措施模板路径, 产成品模板路径)
+    """
+    os.makedirs(directory, exist_ok=True)
+    cells = REPORT_TEXT_CELLS + REPORT_NUMBER_CELLS + [REPORT_DATE_CELL]
+
+    wb = Workbook()
+    ws = wb.active
+    ws['A1'], ws['B1'] = '序号', '文件名'
+    for offset, cell in enumerate(cells):
+        ws.cell(row=3, column=3 + offset, value=f'字段{offset + 1}')
+        ws.cell(row=CAPA_MAPPING_ROW, column=3 + offset, value=cell)
+    capa_path = os.path.join(directory, 'capa_template.xlsx')
+    wb.save(capa_path)
+
+    wb = Workbook()
+    ws = wb.active
+    for offset, cell in enumerate(cells):
+        ws.cell(row=PRODUCT_MAPPING_ROW, column=3 + offset, value=cell)
+    ws['AR1'] = REPORT_POWER_RANGE_CELL
+    ws['AT1'] = REPORT_POWER_CELL
+    product_path = os.path.join(directory, 'product_template.xlsx')
+    wb.save(product_path)
+    return capa_path, product_path
+
+
+def write_inspection_report(path, index, seed=DEFAULT_SEED):
+    """生成一份检验报告，包含模板映射表引用的全部单元格以及一些不被引用的内容"""
+    rng = _rng(seed, index)
+    wb = Workbook()
+    ws = wb.active
+    for cell in REPORT_TEXT_CELLS:
+        ws[cell] = f'报告{index}-{cell}-{rng.integers(1000)}'
+    for cell in REPORT_NUMBER_CELLS:
+        ws[cell] = float(np.round(rng.normal(100, 10), 3))
+    ws[REPORT_DATE_CELL] = datetime(2025, 1, 1) + timedelta(days=int(rng.integers(365)))
+    low = int(rng.integers(10, 50)) * 10
+    ws[REPORT_POWER_RANGE_CELL] = f'{low}Wxx-{low * 2}Wxxxx'
+    ws[REPORT_POWER_CELL] = float(np.round(low * rng.uniform(1.0, 1.5), 2))
+    # 报告正文中不参与汇总的内容
+    for row in range(15, 60):
+        for col in range(1, 9):
+            ws.cell(row=row, column=col, value=f'说明{row}-{col}' if col % 2 else float(row * col))
+    wb.save(path)
+
+
+def write_inspection_reports(directory, n_files, seed=DEFAULT_SEED):
+    """生成n_files份检验报告，返回文件路径列表"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(n_files):
+        path = os.path.join(directory, f'report_{index:05d}.xlsx')
+        if not os.path.exists(path):
+            write_inspection_report(path, index, seed)
+        paths.append(path)
+    return paths
+
+
+def log_frame_columns(kind, n_columns):
+    """各类日志的列名：time + 类型列 + 其余参数列，共n_columns列（不含time）"""
+    if kind == 'alarm':
+        return ['报警类型', '报警代码'] + [f'附加信息{i}' for i in range(max(0, n_columns - 2))]
+    if kind == 'operate':
+        return ['操作类型', '用户'] + [f'附加信息{i}' for i in range(max(0, n_columns - 2))]
+    return ['运行模式'] + [f'P{i}' for i in range(max(1, n_columns - 1))]
+
+
+def write_log(path, kind, n_rows, n_columns, seed=DEFAULT_SEED):
+    """
+    生成设备日志xlsx：第一列为时间（文本，格式与设备导出一致），其余为报警/操作类型或状态参数
+    Args:
+        path (str): 输出的xlsx文件
+        kind (str): 'alarm'、'operate'或'status'
+        n_rows (int): 行数
+        n_columns (int): 除时间外的列数
+        seed (int): 随机种子
+    """
+    rng = _rng(seed, n_rows, n_columns, ['alarm', 'operate', 'status'].index(kind))
+    columns = log_frame_columns(kind, n_columns)
+    seconds = np.cumsum(rng.integers(1, 60 if kind != 'status' else 5, n_rows))
+    times = [(LOG_START + timedelta(seconds=int(s))).strftime('%Y-%m-%d %H:%M:%S') for s in seconds]
+
+    if kind == 'status':
+        mode_names = np.array(['运行', '待机', '预热'])
+        modes = mode_names[rng.choice(3, n_rows, p=[0.8, 0.15, 0.05])]
+        drift = np.linspace(0, 1, n_rows)
+        values = rng.normal(size=(n_rows, len(columns) - 1)) + drift[:, None]
+        # 少量缺失值
+        values[rng.random(values.shape) < 0.001] = np.nan
+        body = [[mode, *[None if np.isnan(v) else round(float(v), 4) for v in row]]
+                for mode, row in zip(modes, values)]
+    else:
+        names = np.array([f'{"报警" if kind == "alarm" else "操作"}{i:02d}' for i in range(50)])
+        # 少数类型出现频繁，接近实际日志的分布
+        weights = 1.0 / np.arange(1, 51)
+        picks = rng.choice(50, n_rows, p=weights / weights.sum())
+        extra = rng.integers(0, 10000, (n_rows, len(columns) - 2))
+        second = picks if kind == 'alarm' else rng.choice(['admin', 'operator', 'engineer'], n_rows)
+        body = [[names[pick], int(code) if kind == 'alarm' else code, *map(int, row)]
+                for pick, code, row in zip(picks, second, extra)]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(['time'] + columns)
+    for time_text, row in zip(times, body):
+        ws.append([time_text] + row)
+    wb.save(path)
+
+
+def dataset_path(directory, name, **params):
+    """按生成参数命名的数据文件路径，参数或生成规则不同时文件名不同"""
+    suffix = '_'.join(f'{key}{value}' for key, value in sorted(params.items()))
+    return os.path.join(directory, f'{name}_{suffix}_v{GENERATOR_VERSION}')
+
+
+def ensure_ophir_files(directory, n_files, n_frames, seed=DEFAULT_SEED):
+    """生成（或复用已生成的）n_files个Ophir文件"""
+    folder = dataset_path(directory, 'm2', frames=n_frames, seed=seed)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for index in range(n_files):
+        path = os.path.join(folder, f'm2_{index:04d}.csv')
+        if not os.path.exists(path):
+            write_ophir_csv(path, n_frames, seed + index)
+        paths.append(path)
+    return paths
+
+
+def ensure_reports(directory, n_files, seed=DEFAULT_SEED):
+    """生成（或复用已生成的）模板和检验报告，返回 (纠正预防措施模板, 产成品模板, 报告列表)"""
+    folder = dataset_path(directory, 'reports', seed=seed)
+    capa_path = os.path.join(folder, 'capa_template.xlsx')
+    product_path = os.path.join(folder, 'product_template.xlsx')
+    if not (os.path.exists(capa_path) and os.path.exists(product_path)):
+        write_report_templates(folder)
+    return capa_path, product_path, write_inspection_reports(os.path.join(folder, 'data'), n_files, seed)
+
+
+def ensure_log(directory, kind, n_rows, n_columns, seed=DEFAULT_SEED):
+    """生成（或复用已生成的）日志文件"""
+    os.makedirs(directory, exist_ok=True)
+    path = dataset_path(directory, f'{kind}_log', rows=n_rows, columns=n_columns, seed=seed) + '.xlsx'
+    if not os.path.exists(path):
+        write_log(path, kind, n_rows, n_columns, seed)
+    return path
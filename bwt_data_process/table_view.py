@@ -0,0 +1,121 @@
+"""
+日志表格的服务器端分页
+
+列选择、文本搜索和排序都在服务器上完成，只把当前页的数据发送到浏览器，
+每次交互传输的数据量与日志大小无关。搜索和排序得到的行顺序在日志缓存中复用，
+翻页时只需按位置取出当前页。
+"""
+import numpy as np
+import pandas as pd
+
+from .logs import log_cache
+
+
+DEFAULT_PAGE_SIZE = 100
+PAGE_SIZES = [50, 100, 500, 1000]
+
+
+def _value_mask(series, match):
+    """
+    对取值去重后逐个判断，再按编码映射回各行
+    日志中的文本列取值个数通常远少于行数，比逐行做字符串操作快得多
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        uniques = series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+    hits = np.flatnonzero(match(pd.Index(uniques).astype(str)))
+    if len(hits) == 0:
+        return np.zeros(len(series), dtype=bool)
+    return np.isin(codes, hits)
+
+
+def search_mask(df, text, columns=None):
+    """
+    搜索包含text的行（不区分大小写）
+    文本列按子串匹配；text可以转为数值时，数值列按相等匹配；时间列不参与搜索。
+    """
+    if columns is None:
+        columns = list(df.columns)
+    needle = text.strip().lower()
+    try:
+        number = float(needle)
+    except ValueError:
+        number = None
+
+    mask = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            if number is not None:
+                mask |= (series.to_numpy() == number)
+        elif not pd.api.types.is_datetime64_any_dtype(series.dtype):
+            mask |= _value_mask(series, lambda values: values.str.lower().str.contains(needle, regex=False))
+    return mask
+
+
+def _sort_key(series):
+    """分类列按取值的字典序排序，而不是按分类编码的顺序"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.reorder_categories(sorted(series.cat.categories, key=str), ordered=True)
+    return series
+
+
+def row_order(df, search=None, search_columns=None, sort_by=None, ascending=True):
+    """
+    搜索和排序后各行在df中的位置
+    Returns:
+        np.ndarray: 行位置；不搜索也不排序时返回None（按原顺序）
+    """
+    if not search and sort_by is None:
+        return None
+
+    source_key = df.attrs.get('source_key')
+    key = None
+    if source_key is not None and len(df):
+        # 同一份日志按时间排序，首尾时间和行数相同即为同一时间范围
+        key = ('table_order', source_key, len(df), df.index[0], df.index[-1], search,
+               tuple(search_columns or ()), sort_by, ascending)
+        cached = log_cache.get(key)
+        if cached is not None:
+            return cached['position'].to_numpy()
+
+    if search:
+        positions = np.flatnonzero(search_mask(df, search, search_columns))
+    else:
+        positions = np.arange(len(df))
+    if sort_by is not None:
+        column = _sort_key(df[sort_by].iloc[positions].reset_index(drop=True))
+        order = column.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+        positions = positions[order]
+
+    if key is not None:
+        log_cache.put(key, pd.DataFrame({'position': positions}))
+    return positions
+
+
+def table_page(df, columns=None, search=None, sort_by=None, ascending=True, page=0, page_size=DEFAULT_PAGE_SIZE):
+    """
+    取出一页数据
+    Args:
+        df (pd.DataFrame): 日志（通常为按时间范围过滤后的切片）
+        columns (list): 显示的列，默认为全部列；搜索也只在这些列中进行
+        search (str): 搜索文本
+        sort_by (str): 排序列，None为保持原顺序
+        ascending (bool): 是否升序
+        page (int): 页码（从0开始）
+        page_size (int): 每页行数
+    Returns:
+        tuple: (当前页数据, 符合条件的总行数)
+    """
+    if columns is None:
+        columns = list(df.columns)
+    positions = row_order(df, search, columns, sort_by, ascending)
+    total = len(df) if positions is None else len(positions)
+    start = max(0, min(page, max(0, (total - 1) // page_size))) * page_size
+    if positions is None:
+        rows = df.iloc[start:start + page_size]
+    else:
+        rows = df.iloc[positions[start:start + page_size]]
+    return rows[columns], total
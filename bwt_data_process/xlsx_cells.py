@@ -0,0 +1,292 @@
+"""
+直接从xlsx压缩包中读取指定单元格
+
+只解析工作表XML和共享字符串中需要的部分，找到全部目标单元格后立即停止，
+避免openpyxl为整个工作簿建立对象模型。返回的值与
+load_workbook(data_only=True) 读取的结果一致（日期已转换为datetime）。
+"""
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+from openpyxl.utils.cell import column_index_from_string
+
+
+_CELL_RE = re.compile(r'^\$?([A-Za-z]{1,3})\$?(\d+)$')
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+def _local(tag):
+    """去掉XML命名空间"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def split_address(address):
+    """
+    拆分带工作表名的地址：'Sheet2!B3' -> ('Sheet2', 'B3')，"'检验 记录'!B3" -> ('检验 记录', 'B3')，
+    不带工作表名时工作表为None
+    """
+    address = str(address).strip()
+    if '!' not in address:
+        return None, address
+    sheet, cell = address.rsplit('!', 1)
+    if len(sheet) >= 2 and sheet[0] == sheet[-1] == "'":
+        sheet = sheet[1:-1].replace("''", "'")
+    return sheet, cell
+
+
+def parse_address(address):
+    """将单元格地址（如 'B2'、'$B$2'）转换为 (行号, 列号)"""
+    match = _CELL_RE.match(str(address).strip())
+    if not match:
+        raise ValueError(f"无效的单元格地址：{address}")
+    return int(match.group(2)), column_index_from_string(match.group(1).upper())
+
+
+def _cast_number(value):
+    """与openpyxl一致：含小数点或指数的转为float，否则为int"""
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxCellReader:
+    """读取一个xlsx文件中的指定单元格，工作簿结构和样式只解析一次"""
+
+    def __init__(self, source):
+        self.zip = zipfile.ZipFile(source)
+        self.sheet_paths, self.active_index = self._read_workbook()
+        self.date_styles, self.timedelta_styles = self._read_styles()
+
+    def close(self):
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_workbook(self):
+        """读取工作表名称与XML路径的对应关系、当前活动工作表和日期系统"""
+        rels = {}
+        with self.zip.open('xl/_rels/workbook.xml.rels') as f:
+            for _, element in iterparse(f):
+                if _local(element.tag) == 'Relationship':
+                    target = element.get('Target')
+                    if target.startswith('/'):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(posixpath.join('xl', target))
+                    rels[element.get('Id')] = target
+
+        sheet_paths = {}
+        active_index = 0
+        self.epoch = CALENDAR_WINDOWS_1900
+        with self.zip.open('xl/workbook.xml') as f:
+            for _, element in iterparse(f):
+                tag = _local(element.tag)
+                if tag == 'sheet':
+                    sheet_paths[element.get('name')] = rels.get(element.get(_REL_NS))
+                elif tag == 'workbookView':
+                    active_index = int(element.get('activeTab', 0))
+                elif tag == 'workbookPr' and element.get('date1904') in ('1', 'true'):
+                    self.epoch = CALENDAR_MAC_1904
+        return sheet_paths, active_index
+
+    def _read_styles(self):
+        """找出数字格式为日期/时长的样式编号"""
+        date_styles, timedelta_styles = set(), set()
+        if 'xl/styles.xml' not in self.zip.namelist():
+            return date_styles, timedelta_styles
+
+        custom_formats = {}
+        style_index = 0
+        in_cell_xfs = False
+        with self.zip.open('xl/styles.xml') as f:
+            for event, element in iterparse(f, events=('start', 'end')):
+                tag = _local(element.tag)
+                if tag == 'cellXfs':
+                    in_cell_xfs = event == 'start'
+                elif event == 'end' and tag == 'numFmt':
+                    custom_formats[int(element.get('numFmtId'))] = element.get('formatCode')
+                elif event == 'end' and tag == 'xf' and in_cell_xfs:
+                    num_fmt_id = int(element.get('numFmtId', 0))
+                    fmt = custom_formats.get(num_fmt_id, BUILTIN_FORMATS.get(num_fmt_id))
+                    if fmt and is_date_format(fmt):
+                        date_styles.add(style_index)
+                        if is_timedelta_format(fmt):
+                            timedelta_styles.add(style_index)
+                    style_index += 1
+        return date_styles, timedelta_styles
+
+    def sheet_path(self, sheet=None):
+        """工作表对应的XML路径，sheet为None时取活动工作表"""
+        if sheet is None:
+            paths = list(self.sheet_paths.values())
+            if not paths:
+                raise ValueError("工作簿中没有工作表")
+            return paths[min(self.active_index, len(paths) - 1)]
+        if sheet not in self.sheet_paths:
+            raise KeyError(f"工作簿中没有名为 {sheet} 的工作表")
+        return self.sheet_paths[sheet]
+
+    def _read_shared_strings(self, indexes):
+        """只读取需要的共享字符串，读到最大的编号后停止"""
+        strings = {}
+        if not indexes or 'xl/sharedStrings.xml' not in self.zip.namelist():
+            return strings
+        last_index = max(indexes)
+        index = 0
+        with self.zip.open('xl/sharedStrings.xml') as f:
+            parts = []
+            in_phonetic = False
+            for event, element in iterparse(f, events=('start', 'end')):
+                tag = _local(element.tag)
+                if tag == 'rPh':
+                    in_phonetic = event == 'start'
+                elif event != 'end':
+                    continue
+                elif tag == 't' and not in_phonetic:
+                    parts.append(element.text or '')
+                elif tag == 'si':
+                    if index in indexes:
+                        strings[index] = ''.join(parts)
+                    if index >= last_index:
+                        break
+                    index += 1
+                    parts = []
+                    element.clear()
+        return strings
+
+    def read(self, addresses, sheet=None):
+        """
+        读取一个工作表中的指定单元格
+        Args:
+            addresses (iterable): 单元格地址，如 ['B2', 'C5']
+            sheet (str): 工作表名称，默认为活动工作表
+        Returns:
+            dict: {单元格地址: 值}，空单元格的值为None
+        """
+        return self.read_sheets({sheet: addresses})[sheet]
+
+    def read_sheets(self, requests):
+        """
+        读取多个工作表中的指定单元格，每个工作表只扫描一次，共享字符串也只读取一次
+        Args:
+            requests (dict): {工作表名称（None为活动工作表）: 单元格地址列表}
+        Returns:
+            dict: {工作表名称: {单元格地址: 值}}，空单元格的值为None
+        """
+        found = {sheet: self._scan_sheet(sheet, addresses) for sheet, addresses in requests.items()}
+
+        # 共享字符串在所有工作表扫描完成后统一读取
+        string_indexes = {value for sheet_found in found.values() for kind, value in sheet_found.values()
+                          if kind == 's'}
+        strings = self._read_shared_strings(string_indexes)
+
+        results = {}
+        for sheet, addresses in requests.items():
+            values = {address: None for address in addresses}
+            for address, (kind, value) in found[sheet].items():
+                values[address] = strings.get(value) if kind == 's' else value
+            results[sheet] = values
+        return results
+
+    def _scan_sheet(self, sheet, addresses):
+        """扫描工作表XML直到找到全部目标单元格，返回 {单元格地址: 原始值}（共享字符串为其编号）"""
+        wanted = {}
+        for address in addresses:
+            wanted.setdefault(parse_address(address), []).append(address)
+        if not wanted:
+            return {}
+
+        last_row = max(row for row, _ in wanted)
+        found = {}
+        remaining = len(wanted)
+        row_counter = 0
+        col_counter = 0
+
+        with self.zip.open(self.sheet_path(sheet)) as f:
+            for event, element in iterparse(f, events=('start', 'end')):
+                tag = _local(element.tag)
+                if event == 'start':
+                    if tag == 'row':
+                        row_counter = int(element.get('r', row_counter + 1))
+                        col_counter = 0
+                        if row_counter > last_row:
+                            break
+                    continue
+
+                if tag == 'c':
+                    coordinate = element.get('r')
+                    if coordinate:
+                        position = parse_address(coordinate)
+                        col_counter = position[1]
+                    else:
+                        col_counter += 1
+                        position = (row_counter, col_counter)
+                    if position in wanted:
+                        raw = self._raw_cell(element)
+                        for address in wanted[position]:
+                            found[address] = raw
+                        remaining -= 1
+                    element.clear()
+                    if remaining == 0:
+                        break
+                elif tag == 'row':
+                    element.clear()
+        return found
+
+    def _raw_cell(self, element):
+        """解析单元格，共享字符串先返回其编号"""
+        data_type = element.get('t', 'n')
+        if data_type == 'inlineStr':
+            texts = [child.text or '' for child in element.iter() if _local(child.tag) == 't']
+            return 'v', ''.join(texts) if texts else None
+
+        value = None
+        for child in element:
+            if _local(child.tag) == 'v':
+                value = child.text or None
+                break
+        if value is None:
+            return 'v', None
+
+        if data_type == 's':
+            return 's', int(value)
+        if data_type == 'n':
+            value = _cast_number(value)
+            style_id = int(element.get('s', 0))
+            if style_id in self.date_styles:
+                try:
+                    value = from_excel(value, self.epoch, timedelta=style_id in self.timedelta_styles)
+                except (OverflowError, ValueError):
+                    value = '#VALUE!'
+        elif data_type == 'b':
+            value = bool(int(value))
+        elif data_type == 'd':
+            value = from_ISO8601(value)
+        return 'v', value
+
+
+def read_cells(source, addresses, sheet=None):
+    """
+    从xlsx文件中读取指定单元格的值
+    Args:
+        source: 文件路径或二进制文件对象
+        addresses (iterable): 单元格地址，可带工作表名（如 'Sheet2!B3'）
+        sheet (str): 不带工作表名的地址所在的工作表，默认为活动工作表
+    Returns:
+        dict: {单元格地址: 值}
+    """
+    requests = {}
+    for address in addresses:
+        address_sheet, cell = split_address(address)
+        requests.setdefault(sheet if address_sheet is None else address_sheet, {})[address] = cell
+    with XlsxCellReader(source) as reader:
+        results = reader.read_sheets({name: list(cells.values()) for name, cells in requests.items()})
+    return {address: results[name][cell] for name, cells in requests.items() for address, cell in cells.items()}
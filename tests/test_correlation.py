@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bwt_data_process.correlation import correlate_alarms
+
+
+def test_window_std_with_large_offset():
+    rng = np.random.default_rng(0)
+    n = 200_000
+    times = pd.date_range('2025-01-01', periods=n, freq='s')
+    values = 1e6 + rng.normal(0, 0.01, n)
+    status = pd.DataFrame({'time': times, 'P0': values})
+    alarm_times = times[[1000, 50_000, 150_000]]
+    alarms = pd.DataFrame({'time': alarm_times, '报警类型': ['E01'] * 3})
+
+    stats = correlate_alarms(alarms, status, '报警类型', ['P0'], before=60, after=60).loc[('E01', 'P0')]
+
+    window = np.concatenate([
+        values[(times >= t - pd.Timedelta(seconds=60)) & (times <= t + pd.Timedelta(seconds=60))]
+        for t in alarm_times
+    ])
+    assert stats['窗口均值'] == pytest.approx(window.mean(), abs=1e-6)
+    assert stats['窗口标准差'] == pytest.approx(window.std(), rel=1e-3)
@@ -0,0 +1,62 @@
+from openpyxl import Workbook
+
+from bwt_data_process.alarm_stats import read_buckets
+from bwt_data_process.log_store import import_log, query_logs, query_logs_cached
+
+
+def write_alarm_log(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['time', '报警类型'])
+    for row in rows:
+        ws.append(list(row))
+    wb.save(path)
+
+
+def alarm_counts(store_dir):
+    df = query_logs('alarm', store_dir=store_dir)
+    return df['报警类型'].value_counts().to_dict()
+
+
+def bucket_counts(store_dir):
+    df = query_logs_cached('alarm', store_dir=store_dir)
+    buckets = read_buckets(df.attrs['alarm_stats_paths'])
+    buckets = buckets[buckets['column'] == '报警类型']
+    return buckets.groupby('value')['count'].sum().to_dict()
+
+
+def test_same_second_repeats_are_kept_and_reimport_adds_nothing(tmp_path):
+    source = tmp_path / 'alarm.xlsx'
+    write_alarm_log(source, [
+        ('2025-01-01 08:00:00', 'E01'),
+        ('2025-01-01 08:00:00', 'E01'),
+        ('2025-01-01 08:00:00', 'E01'),
+        ('2025-01-01 08:00:05', 'E02'),
+    ])
+    store_dir = str(tmp_path / 'store')
+
+    assert import_log(str(source), 'alarm', 'dev', store_dir)['added'] == 4
+    assert alarm_counts(store_dir) == {'E01': 3, 'E02': 1}
+    assert bucket_counts(store_dir) == {'E01': 3, 'E02': 1}
+
+    assert import_log(str(source), 'alarm', 'dev', store_dir)['added'] == 0
+    assert alarm_counts(store_dir) == {'E01': 3, 'E02': 1}
+    assert bucket_counts(store_dir) == {'E01': 3, 'E02': 1}
+
+
+def test_overlapping_export_only_adds_missing_rows(tmp_path):
+    store_dir = str(tmp_path / 'store')
+    first = tmp_path / 'first.xlsx'
+    write_alarm_log(first, [('2025-01-01 08:00:00', 'E01'), ('2025-01-01 09:00:00', 'E02')])
+    second = tmp_path / 'second.xlsx'
+    write_alarm_log(second, [
+        ('2025-01-01 09:00:00', 'E02'),
+        ('2025-01-01 09:00:00', 'E02'),
+        ('2025-01-02 10:00:00', 'E03'),
+    ])
+
+    import_log(str(first), 'alarm', 'dev', store_dir)
+    # 库中已有一条09:00的E02，新文件中有两条，只新增一条
+    assert import_log(str(second), 'alarm', 'dev', store_dir)['added'] == 2
+    assert alarm_counts(store_dir) == {'E01': 1, 'E02': 2, 'E03': 1}
+    assert bucket_counts(store_dir) == {'E01': 1, 'E02': 2, 'E03': 1}
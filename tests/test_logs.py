@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from bwt_data_process.logs import index_by_time, load_log, read_log_chunked
+
+
+def write_status_log(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['time', 'P0', 'P1'])
+    for row in rows:
+        ws.append(list(row))
+    wb.save(path)
+
+
+def test_chunked_reader_keeps_text_after_numeric_chunks(tmp_path):
+    path = tmp_path / 'status.xlsx'
+    rows = [(f'2025-01-01 00:00:{second:02d}', second, 1.5) for second in range(6)]
+    rows += [('2025-01-01 00:00:06', 'OFF', 2.5), ('2025-01-01 00:00:07', 7, None)]
+    write_status_log(path, rows)
+
+    df = read_log_chunked(str(path), chunk_rows=3)
+
+    assert df['P0'].astype(str).tolist() == ['0', '1', '2', '3', '4', '5', 'OFF', '7']
+    assert df['P0'].astype(str).tolist() == load_log(str(path))['P0'].astype(str).tolist()
+    # 没有出现文本的列仍为数值列
+    assert str(df['P1'].dtype) == 'float32'
+    assert df['P1'].isna().sum() == 1
+
+
+def test_chunked_reader_text_column_after_empty_chunks(tmp_path):
+    path = tmp_path / 'status.xlsx'
+    rows = [(f'2025-01-01 00:00:{second:02d}', None, 1.0) for second in range(4)]
+    rows += [('2025-01-01 00:00:04', 'A', 1.0), ('2025-01-01 00:00:05', 3, 1.0)]
+    write_status_log(path, rows)
+
+    df = read_log_chunked(str(path), chunk_rows=2)
+
+    assert df['P0'].isna().sum() == 4
+    assert df['P0'].dropna().astype(str).tolist() == ['A', '3']
+
+
+def test_index_by_time_does_not_modify_input():
+    df = pd.DataFrame({'time': pd.date_range('2025-01-01', periods=3, freq='min'), 'P0': [1.0, 2.0, 3.0]})
+    df.attrs['source_key'] = 'key'
+
+    indexed = index_by_time(df)
+
+    assert isinstance(indexed.index, pd.DatetimeIndex)
+    assert indexed.attrs['source_key'] == 'key'
+    assert df.index.equals(pd.RangeIndex(3))
+    # 浅拷贝：不复制列数据
+    assert np.shares_memory(indexed['P0'].to_numpy(), df['P0'].to_numpy())